@@ -1,18 +1,32 @@
 import os
 import re
 import json
+import hashlib
 import asyncio
+import sqlite3
+import functools
+import aiofiles
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
+import httpx
 from openai import OpenAI, AsyncOpenAI
 import numpy as np
 import instructor
+from aiolimiter import AsyncLimiter
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from rich.traceback import install as rich_install
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import bisect
+from typing import List, Optional, Tuple
 from sklearn.cluster import HDBSCAN
 from image_chunking import ImageChunker
 
@@ -20,17 +34,93 @@ load_dotenv()
 
 # Configurable defaults
 DEFAULT_EMBEDDING_BATCH_SIZE = 100
+DEFAULT_EMBEDDING_CONCURRENCY = 8
+DEFAULT_EMBEDDING_TOKEN_BUDGET = 200_000
 DEFAULT_ENRICH_BATCH_SIZE = 10
+DEFAULT_ENRICH_GROUP_SIZE = 4
+DEFAULT_PIPELINE_BUFFER = 4
 DEFAULT_MAX_DYNAMIC_SIZE = 2000
 DEFAULT_MIN_DYNAMIC_SIZE = 300
 DEFAULT_LONG_PARAGRAPH_LENGTH = 500
 DEFAULT_MAX_RETRIES = 3
+DEFAULT_CHAT_RPM = 300
+DEFAULT_EMBEDDING_RPM = 3000
+DEFAULT_EMBEDDING_CACHE_DIR = Path.home() / ".cache" / "notebooklm"
+
+# Precompiled patterns shared across all get_markdown_units calls.
+# Bytes patterns: get_markdown_units works on the UTF-8 buffer directly.
+_PARA_RE = re.compile(rb'\n\s*\n')
+_SENT_RE = re.compile(rb'(?<=[.!?])\s+')
+
+def _dumps_indent2(data: dict) -> str:
+    """Serialize with the C-accelerated orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+def _loads(raw: bytes):
+    """Deserialize with the C-accelerated orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+@dataclass(frozen=True)
+class EnvConfig:
+    """Environment-derived defaults, read once per process."""
+    embedding_model: str
+    embedding_api_key: Optional[str]
+    embedding_base_url: Optional[str]
+    chat_model: str
+    chat_api_key: Optional[str]
+    chat_base_url: Optional[str]
+
+@functools.lru_cache(maxsize=1)
+def _env_config() -> EnvConfig:
+    return EnvConfig(
+        embedding_model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
+        embedding_api_key=os.getenv("OPENAI_EMBEDDING_API_KEY") or os.getenv("OPENAI_API_KEY"),
+        embedding_base_url=os.getenv("OPENAI_EMBEDDING_BASE_URL") or os.getenv("OPENAI_BASE_URL"),
+        chat_model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+        chat_api_key=os.getenv("OPENAI_API_KEY"),
+        chat_base_url=os.getenv("OPENAI_BASE_URL"),
+    )
+
+@functools.lru_cache(maxsize=8)
+def _token_encoder(model: str):
+    """Tokenizer for batch budgeting, or None when tiktoken is absent."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+@functools.lru_cache(maxsize=8)
+def _make_clients(api_key: Optional[str], base_url: Optional[str]):
+    """Share one sync/async client pair (and its httpx pools) per endpoint.
+
+    The async client gets an explicit transport: HTTP/2 multiplexes the
+    bursty embedding/enrichment gathers over few connections, and the raised
+    pool limits stop the default cap from throttling them.
+    """
+    http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+    return (
+        OpenAI(api_key=api_key, base_url=base_url),
+        AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http),
+    )
 
 class ChunkMetadata(BaseModel):
     summary: str = Field(..., description="A concise 1-sentence summary of the text.")
     hypothetical_questions: List[str] = Field(..., description="A list of 2-4 questions this text answers.")
     keywords: List[str] = Field(..., description="A list of 3-5 key entities/keywords found in the text.")
 
+class ChunkMetadataBatch(BaseModel):
+    items: List[ChunkMetadata] = Field(..., description="Metadata for each chunk, in the same order as the input chunks.")
+
 class Chunker:
     def __init__(self,
                  embedding_model: Optional[str] = None,
@@ -40,312 +130,432 @@ class Chunker:
                  chat_api_key: Optional[str] = None,
                  chat_base_url: Optional[str] = None,
                  embedding_batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+                 embedding_concurrency: int = DEFAULT_EMBEDDING_CONCURRENCY,
                  enrich_batch_size: int = DEFAULT_ENRICH_BATCH_SIZE,
+                 enrich_group_size: int = DEFAULT_ENRICH_GROUP_SIZE,
                  max_dynamic_size: int = DEFAULT_MAX_DYNAMIC_SIZE,
                  min_dynamic_size: int = DEFAULT_MIN_DYNAMIC_SIZE,
                  long_paragraph_length: int = DEFAULT_LONG_PARAGRAPH_LENGTH,
-                 max_retries: int = DEFAULT_MAX_RETRIES):
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 chat_rpm: int = DEFAULT_CHAT_RPM,
+                 embedding_rpm: int = DEFAULT_EMBEDDING_RPM,
+                 embedding_token_budget: int = DEFAULT_EMBEDDING_TOKEN_BUDGET,
+                 embedding_cache_dir: Optional[Path] = None):
 
-        self.model_name = embedding_model or os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        env = _env_config()
+        self.model_name = embedding_model or env.embedding_model
 
-        embedding_api_key = embedding_api_key or os.getenv("OPENAI_EMBEDDING_API_KEY") or os.getenv("OPENAI_API_KEY")
-        embedding_base_url = embedding_base_url or os.getenv("OPENAI_EMBEDDING_BASE_URL") or os.getenv("OPENAI_BASE_URL")
+        embedding_api_key = embedding_api_key or env.embedding_api_key
+        embedding_base_url = embedding_base_url or env.embedding_base_url
 
-        self.client = OpenAI(api_key=embedding_api_key, base_url=embedding_base_url)
-        self.async_client = AsyncOpenAI(api_key=embedding_api_key, base_url=embedding_base_url)
+        self.client, self.async_client = _make_clients(embedding_api_key, embedding_base_url)
 
         # Tunable parameters (defaults are defined at module level)
         self.embedding_batch_size = embedding_batch_size
+        self.embedding_concurrency = embedding_concurrency
+        self.embedding_token_budget = embedding_token_budget
         self.enrich_batch_size = enrich_batch_size
+        self.enrich_group_size = enrich_group_size
         self.max_dynamic_size = max_dynamic_size
         self.min_dynamic_size = min_dynamic_size
         self.long_paragraph_length = long_paragraph_length
         self.max_retries = max_retries
 
-        chat_api_key = chat_api_key or os.getenv("OPENAI_API_KEY")
-        chat_base_url = chat_base_url or os.getenv("OPENAI_BASE_URL")
-        self.chat_model = chat_model or os.getenv("OPENAI_MODEL", "gpt-4o")
+        # Proactive request-per-minute throttles; staying under the provider
+        # ceiling avoids 429-driven retry storms under bursty gathers.
+        self.chat_limiter = AsyncLimiter(chat_rpm, 60)
+        self.embedding_limiter = AsyncLimiter(embedding_rpm, 60)
+
+        chat_api_key = chat_api_key or env.chat_api_key
+        chat_base_url = chat_base_url or env.chat_base_url
+        self.chat_model = chat_model or env.chat_model
+
+        chat_client, async_chat_client = _make_clients(chat_api_key, chat_base_url)
+        self.chat_client = instructor.from_openai(chat_client, mode=instructor.Mode.JSON)
+        self.async_chat_client = instructor.from_openai(async_chat_client, mode=instructor.Mode.JSON)
 
-        self.chat_client = instructor.from_openai(
-            OpenAI(api_key=chat_api_key, base_url=chat_base_url),
-            mode=instructor.Mode.JSON
-        )
-        self.async_chat_client = instructor.from_openai(
-            AsyncOpenAI(api_key=chat_api_key, base_url=chat_base_url),
-            mode=instructor.Mode.JSON
-        )
+        # Persistent text -> embedding cache; one sqlite file per model
+        self.embedding_cache_dir = embedding_cache_dir or DEFAULT_EMBEDDING_CACHE_DIR
+        self._embedding_cache_conns = {}
 
         rich_install()
         self.console = Console()
         self.failed_enrichments = []
 
-    async def get_embeddings(self, texts: List[str], model: Optional[str] = None, batch_size: Optional[int] = None) -> List[List[float]]:
+    def _embedding_cache(self, model: str) -> sqlite3.Connection:
+        conn = self._embedding_cache_conns.get(model)
+        if conn is None:
+            self.embedding_cache_dir.mkdir(parents=True, exist_ok=True)
+            safe_model = re.sub(r'[^\w.-]', '_', model)
+            conn = sqlite3.connect(self.embedding_cache_dir / f"embeddings-{safe_model}.db")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._embedding_cache_conns[model] = conn
+        return conn
+
+    async def get_embeddings(self, texts: List[str], model: Optional[str] = None, batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed texts, returning a contiguous (N, dim) float32 matrix.
+
+        One packed array instead of a list of Python float lists: ~7x less
+        memory per vector and the downstream similarity math operates on it
+        directly with no conversion pass.
+        """
         model = model or self.model_name
-        texts = [t.replace("\n", " ") for t in texts]
+        # Only copy strings that actually contain newlines
+        texts = [t.replace("\n", " ") if "\n" in t else t for t in texts]
         batch_size = batch_size or self.embedding_batch_size
 
-        async def fetch_batch(batch):
-            response = await self.async_client.embeddings.create(input=batch, model=model)
-            return [data.embedding for data in response.data]
-
-        tasks = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            tasks.append(fetch_batch(batch))
+        # Resolve cached embeddings first; only cache misses hit the API
+        conn = self._embedding_cache(model)
+        keys = [hashlib.blake2b(t.encode(), digest_size=16).hexdigest() for t in texts]
+        all_embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        miss_indices = []
+        for i, key in enumerate(keys):
+            row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                all_embeddings[i] = np.frombuffer(row[0], dtype=np.float32)
+            else:
+                miss_indices.append(i)
+
+        if miss_indices:
+            # Pack batches by token budget rather than item count alone: many
+            # long chunks would overflow the model's per-request limit, while
+            # many short ones would waste round trips. Longest-first ordering
+            # keeps batch sizes even. Without tiktoken, ~4 chars/token is a
+            # safe overestimate for English prose.
+            encoder = _token_encoder(model)
+            if encoder is not None:
+                token_lens = {j: len(encoder.encode(texts[j])) for j in miss_indices}
+            else:
+                token_lens = {j: max(1, len(texts[j]) // 4) for j in miss_indices}
+
+            batches: List[List[int]] = []
+            current: List[int] = []
+            current_tokens = 0
+            for j in sorted(miss_indices, key=lambda j: token_lens[j], reverse=True):
+                if current and (len(current) >= batch_size
+                                or current_tokens + token_lens[j] > self.embedding_token_budget):
+                    batches.append(current)
+                    current, current_tokens = [], 0
+                current.append(j)
+                current_tokens += token_lens[j]
+            if current:
+                batches.append(current)
+
+            # Cap in-flight requests so large corpora don't trip provider rate limits
+            sem = asyncio.Semaphore(self.embedding_concurrency)
+
+            async def fetch_batch(index_batch):
+                async with sem, self.embedding_limiter:
+                    response = await self.async_client.embeddings.create(
+                        input=[texts[j] for j in index_batch], model=model
+                    )
+                    return [data.embedding for data in response.data]
+
+            results = await asyncio.gather(*[fetch_batch(b) for b in batches])
+            for index_batch, batch_embeddings in zip(batches, results):
+                for j, embedding in zip(index_batch, batch_embeddings):
+                    vector = np.asarray(embedding, dtype=np.float32)
+                    all_embeddings[j] = vector
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        (keys[j], vector.tobytes())
+                    )
+            conn.commit()
+
+        if not all_embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(all_embeddings)
+
+    def get_markdown_units(self, content: str, long_paragraph_length: Optional[int] = None) -> dict:
+        # Struct-of-arrays layout: parallel columns instead of one dict per
+        # unit, so the hot loops in chunk_text index contiguous arrays.
+        texts: List[str] = []
+        types: List[str] = []
+        header_paths: List[str] = []
+        # Byte offset ranges per unit; resolved to line numbers in one
+        # batched searchsorted after the main loop.
+        unit_offsets = []
+        long_paragraph_length = long_paragraph_length or self.long_paragraph_length
 
-        results = await asyncio.gather(*tasks)
-        all_embeddings: List[List[float]] = []
-        for batch_embeddings in results:
-            all_embeddings.extend(batch_embeddings)
-        return all_embeddings
+        # Encode once and work in the byte domain: the bytes regex engine is
+        # leaner, and byte offsets line up with the vectorized newline scan
+        # below. Unit text is decoded back to str only when stored.
+        buf = content.encode('utf-8')
 
-    @staticmethod
-    def cosine_similarity(v1, v2):
-        return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-
-    def get_markdown_units(self, content: str, long_paragraph_length: Optional[int] = None) -> List[dict]:
-        units = []
-        long_paragraph_length = long_paragraph_length or self.long_paragraph_length
-        
-        # Map character index to line number
-        line_offsets = [0]
-        for i, char in enumerate(content):
-            if char == '\n':
-                line_offsets.append(i + 1)
-        
-        def get_line_number(char_index):
-            # bisect_right returns the insertion point.
-            # If char_index is before the first newline (offset < line_offsets[1]), it returns 1.
-            return bisect.bisect_right(line_offsets, char_index)
+        # Map byte index to line number via a vectorized newline scan
+        data = np.frombuffer(buf, dtype=np.uint8)
+        line_offsets = np.concatenate(([0], np.flatnonzero(data == 0x0A) + 1))
 
         # Split by blank lines to get paragraphs, preserving offsets
         parts = []
         last_end = 0
-        for match in re.finditer(r'\n\s*\n', content):
+        for match in _PARA_RE.finditer(buf):
             start = last_end
             end = match.start()
             if end > start:
-                parts.append((start, end, content[start:end]))
+                parts.append((start, end, buf[start:end]))
             last_end = match.end()
-        if last_end < len(content):
-            parts.append((last_end, len(content), content[last_end:]))
+        if last_end < len(buf):
+            parts.append((last_end, len(buf), buf[last_end:]))
 
-        header_stack = []
+        # Header context as a fixed-depth slot array (markdown caps at h6);
+        # index = level, empty string = no header at that level. Avoids the
+        # pop-loop of a dynamic stack and keeps the joined path current.
+        header_slots = [""] * 7
         current_header_path = ""
 
         for start_offset, end_offset, part in parts:
             # Calculate line range for the whole part
             # We use end_offset - 1 because the range is inclusive of the last character's line
             
-            # Adjust for stripping
-            lstripped = part.lstrip()
-            leading_ws = len(part) - len(lstripped)
-            real_start_offset = start_offset + leading_ws
-            
-            stripped = lstripped.rstrip()
-            real_end_offset = real_start_offset + len(stripped)
-            
+            # Adjust for stripping. One strip() instead of lstrip()+rstrip();
+            # the leading-whitespace width is the index of the first stripped
+            # byte, so no intermediate copy is needed.
+            stripped = part.strip()
             if not stripped:
                 continue
-                
+
+            leading_ws = part.find(stripped[:1])
+            real_start_offset = start_offset + leading_ws
+            real_end_offset = real_start_offset + len(stripped)
+
             part = stripped
-            part_start_line = get_line_number(real_start_offset)
-            part_end_line = get_line_number(real_end_offset - 1)
-
-            if part.startswith('#'):
-                level = len(part.split()[0])
-                header_text = part.lstrip('#').strip()
-                while header_stack and header_stack[-1][0] >= level:
-                    header_stack.pop()
-                header_stack.append((level, header_text))
-                current_header_path = " > ".join([h[1] for h in header_stack])
-                units.append({
-                    "text": part, 
-                    "type": "header", 
-                    "header_path": current_header_path,
-                    "line_start": part_start_line,
-                    "line_end": part_end_line
-                })
-                continue
 
-            current_header_path = " > ".join([h[1] for h in header_stack])
+            if part.startswith(b'#'):
+                level = min(len(part.split()[0]), 6)
+                header_text = part.lstrip(b'#').strip().decode('utf-8')
+                header_slots[level] = header_text
+                for j in range(level + 1, 7):
+                    header_slots[j] = ""
+                current_header_path = " > ".join(h for h in header_slots[1:level + 1] if h)
+                texts.append(part.decode('utf-8'))
+                types.append("header")
+                header_paths.append(current_header_path)
+                unit_offsets.append((real_start_offset, real_end_offset))
+                continue
 
-            if part.startswith('|'):
-                units.append({
-                    "text": part, 
-                    "type": "table", 
-                    "header_path": current_header_path,
-                    "line_start": part_start_line,
-                    "line_end": part_end_line
-                })
+            if part.startswith(b'|'):
+                texts.append(part.decode('utf-8'))
+                types.append("table")
+                header_paths.append(current_header_path)
+                unit_offsets.append((real_start_offset, real_end_offset))
                 continue
 
-            if len(part) > long_paragraph_length:
-                sentences = re.split(r'(?<=[.!?])\s+', part)
-                current_rel_pos = 0
-                for s in sentences:
-                    if not s.strip():
-                        current_rel_pos += len(s)
-                        continue
-                    
+            # The length threshold counts characters, not UTF-8 bytes —
+            # byte length over-counts non-ASCII text and would split
+            # paragraphs the baseline kept whole. The decoded form is
+            # reused by whichever branch stores the unit.
+            part_text = part.decode('utf-8')
+            if len(part_text) > long_paragraph_length:
+                # Walk the sentence-boundary matches with a running offset so
+                # each sentence's position is known directly, instead of
+                # rescanning the paragraph with str.find per sentence.
+                sentence_spans = []
+                pos = 0
+                for delim in _SENT_RE.finditer(part):
+                    sentence_spans.append((pos, delim.start()))
+                    pos = delim.end()
+                sentence_spans.append((pos, len(part)))
+
+                for span_start, span_end in sentence_spans:
+                    s = part[span_start:span_end]
                     s_stripped = s.strip()
-                    found_pos = part.find(s_stripped, current_rel_pos)
-                    if found_pos == -1:
-                        found_pos = current_rel_pos
-                    
-                    s_start_offset = real_start_offset + found_pos
+                    if not s_stripped:
+                        continue
+
+                    leading = len(s) - len(s.lstrip())
+                    s_start_offset = real_start_offset + span_start + leading
                     s_end_offset = s_start_offset + len(s_stripped)
-                    
-                    s_start_line = get_line_number(s_start_offset)
-                    s_end_line = get_line_number(s_end_offset - 1)
-                    
-                    units.append({
-                        "text": s_stripped, 
-                        "type": "text", 
-                        "header_path": current_header_path,
-                        "line_start": s_start_line,
-                        "line_end": s_end_line
-                    })
-                    current_rel_pos = found_pos + len(s_stripped)
-            else:
-                units.append({
-                    "text": part, 
-                    "type": "text", 
-                    "header_path": current_header_path,
-                    "line_start": part_start_line,
-                    "line_end": part_end_line
-                })
 
-        return units
+                    texts.append(s_stripped.decode('utf-8'))
+                    types.append("text")
+                    header_paths.append(current_header_path)
+                    unit_offsets.append((s_start_offset, s_end_offset))
+            else:
+                texts.append(part_text)
+                types.append("text")
+                header_paths.append(current_header_path)
+                unit_offsets.append((real_start_offset, real_end_offset))
+
+        if unit_offsets:
+            # Resolve all line numbers in one batched binary search instead of
+            # two searchsorted calls per unit. side='right' returns the
+            # insertion point, i.e. the 1-based line number of the offset.
+            offsets = np.array(unit_offsets)
+            line_starts = np.searchsorted(line_offsets, offsets[:, 0], side='right').astype(np.int32)
+            line_ends = np.searchsorted(line_offsets, offsets[:, 1] - 1, side='right').astype(np.int32)
+        else:
+            line_starts = np.empty(0, dtype=np.int32)
+            line_ends = np.empty(0, dtype=np.int32)
+
+        return {
+            "text": texts,
+            "type": types,
+            "header_path": header_paths,
+            "line_start": line_starts,
+            "line_end": line_ends
+        }
 
     async def chunk_text(self, content: str, max_dynamic_size: Optional[int] = None, min_dynamic_size: Optional[int] = None, long_paragraph_length: Optional[int] = None) -> List[dict]:
         units = self.get_markdown_units(content)
-        if not units:
+        unit_texts = units["text"]
+        unit_types = units["type"]
+        header_paths = units["header_path"]
+        line_starts = units["line_start"]
+        line_ends = units["line_end"]
+
+        num_units = len(unit_texts)
+        if num_units == 0:
             return []
 
-        unit_texts = [u["text"] for u in units]
-
-        def get_chunk_line_ranges(chunk_units):
-            ranges = []
-            for u in chunk_units:
-                ranges.append((u["line_start"], u["line_end"]))
-            
-            if not ranges:
+        def get_chunk_line_ranges(indices):
+            if not indices:
                 return []
-            
-            ranges.sort(key=lambda x: x[0])
-            
-            merged = []
-            current_start, current_end = ranges[0]
-            for start, end in ranges[1:]:
-                if start <= current_end + 1:
-                    current_end = max(current_end, end)
-                else:
-                    merged.append((current_start, current_end))
-                    current_start, current_end = start, end
-            merged.append((current_start, current_end))
-            return merged
 
-        if len(units) == 1:
+            if len(indices) <= 16:
+                # Python merge beats numpy dispatch overhead on small chunks
+                ranges = [(int(line_starts[i]), int(line_ends[i])) for i in indices]
+                ranges.sort(key=lambda x: x[0])
+
+                merged = []
+                current_start, current_end = ranges[0]
+                for start, end in ranges[1:]:
+                    if start <= current_end + 1:
+                        current_end = max(current_end, end)
+                    else:
+                        merged.append((current_start, current_end))
+                        current_start, current_end = start, end
+                merged.append((current_start, current_end))
+                return merged
+
+            # Vectorized merge: sort by start, carry the running max end with
+            # cummax, and split wherever the next start doesn't touch it.
+            idx = np.asarray(indices)
+            order = np.argsort(line_starts[idx], kind='stable')
+            sorted_starts = line_starts[idx][order]
+            running_ends = np.maximum.accumulate(line_ends[idx][order])
+            breaks = np.flatnonzero(sorted_starts[1:] > running_ends[:-1] + 1) + 1
+            seg_firsts = np.concatenate(([0], breaks))
+            seg_lasts = np.concatenate((breaks - 1, [len(sorted_starts) - 1]))
+            return [(int(sorted_starts[a]), int(running_ends[b])) for a, b in zip(seg_firsts, seg_lasts)]
+
+        if num_units == 1:
             return [{
-                "content": units[0]["text"], 
-                "header_path": units[0]["header_path"],
-                "line_ranges": get_chunk_line_ranges([units[0]])
+                "content": unit_texts[0],
+                "header_path": header_paths[0],
+                "line_ranges": get_chunk_line_ranges([0])
             }]
 
-        self.console.log(f"Semantic chunking: generating embeddings for {len(units)} units...")
-        embeddings = np.array(await self.get_embeddings(unit_texts))
+        MAX_DYNAMIC_SIZE = max_dynamic_size or self.max_dynamic_size
+        MIN_DYNAMIC_SIZE = min_dynamic_size or self.min_dynamic_size
 
-        min_cluster_size = max(2, min(5, len(units) // 4)) if len(units) > 4 else 2
-        cluster_labels = np.zeros(len(units))
-        if len(units) >= min_cluster_size:
+        # Small documents end up as a single chunk regardless of topic
+        # boundaries, so skip the embedding round-trip entirely.
+        total_len = sum(len(t) + 2 for t in unit_texts)
+        if num_units <= 2 or total_len <= MAX_DYNAMIC_SIZE:
+            return [{
+                "content": "\n\n".join(unit_texts),
+                "header_path": header_paths[0],
+                "line_ranges": get_chunk_line_ranges(list(range(num_units)))
+            }]
+
+        self.console.log(f"Semantic chunking: generating embeddings for {num_units} units...")
+        embeddings = await self.get_embeddings(unit_texts)
+
+        min_cluster_size = max(2, min(5, num_units // 4)) if num_units > 4 else 2
+        cluster_labels = np.zeros(num_units)
+        if num_units >= min_cluster_size:
             clusterer = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=1, metric='cosine')
             cluster_labels = clusterer.fit_predict(embeddings.astype('float64'))
             num_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
             self.console.log(f"HDBSCAN found {num_clusters} clusters (topics) and {list(cluster_labels).count(-1)} noise units.")
 
-        similarities = []
-        for i in range(len(embeddings) - 1):
-            sim = self.cosine_similarity(embeddings[i], embeddings[i + 1])
-            similarities.append(sim)
+        # Normalize once, then compute all adjacent similarities in a single
+        # batched row-dot instead of one cosine_similarity call per pair.
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        normalized = embeddings / np.clip(norms, 1e-12, None)
+        similarities = np.einsum('ij,ij->i', normalized[:-1], normalized[1:])
 
-        if not similarities:
+        if similarities.size == 0:
             return [{
-                "content": u["text"], 
-                "header_path": u["header_path"],
-                "line_ranges": get_chunk_line_ranges([u])
-            } for u in units]
+                "content": unit_texts[i],
+                "header_path": header_paths[i],
+                "line_ranges": get_chunk_line_ranges([i])
+            } for i in range(num_units)]
 
         threshold = np.percentile(similarities, 40)
 
         chunks = []
-        current_chunk_units = [units[0]]
-
-        MAX_DYNAMIC_SIZE = max_dynamic_size or self.max_dynamic_size
-        MIN_DYNAMIC_SIZE = min_dynamic_size or self.min_dynamic_size
+        current_indices = [0]
+        # Texts carried in lockstep with current_indices so flushes join once
+        # without rebuilding the list, plus a running length updated in O(1)
+        # instead of re-summing every unit on each iteration.
+        current_texts = [unit_texts[0]]
+        current_text_len = len(unit_texts[0]) + 2
+
+        def flush_chunk(indices, texts_list):
+            chunks.append({
+                "content": "\n\n".join(texts_list),
+                "header_path": header_paths[indices[0]],
+                "line_ranges": get_chunk_line_ranges(indices)
+            })
 
         for i in range(len(similarities)):
             sim = similarities[i]
-            next_unit = units[i + 1]
-            
+            next_idx = i + 1
+
             is_local_shift = sim < threshold
             is_cluster_shift = cluster_labels[i] != cluster_labels[i+1]
-            
+
             if cluster_labels[i] == -1 and cluster_labels[i+1] == -1:
                 is_cluster_shift = False
 
-            current_text_len = sum(len(u["text"]) + 2 for u in current_chunk_units)
-
             is_topic_shift = is_local_shift or is_cluster_shift
             is_big_enough = current_text_len >= MIN_DYNAMIC_SIZE
-            will_be_too_big = current_text_len + len(next_unit["text"]) > MAX_DYNAMIC_SIZE
+            will_be_too_big = current_text_len + len(unit_texts[next_idx]) > MAX_DYNAMIC_SIZE
 
             if (is_topic_shift and is_big_enough) or will_be_too_big:
-                chunk_content = "\n\n".join([u["text"] for u in current_chunk_units])
-                chunk_header_path = current_chunk_units[0]["header_path"]
-                line_ranges = get_chunk_line_ranges(current_chunk_units)
-
-                chunks.append({
-                    "content": chunk_content, 
-                    "header_path": chunk_header_path,
-                    "line_ranges": line_ranges
-                })
-
-                last_unit = current_chunk_units[-1]
-                if last_unit["type"] != "header":
-                    current_chunk_units = [last_unit, next_unit]
+                flush_chunk(current_indices, current_texts)
+
+                last_idx = current_indices[-1]
+                if unit_types[last_idx] != "header":
+                    current_indices = [last_idx, next_idx]
                 else:
-                    current_chunk_units = [next_unit]
+                    current_indices = [next_idx]
+                current_texts = [unit_texts[j] for j in current_indices]
+                current_text_len = sum(len(t) + 2 for t in current_texts)
             else:
-                current_chunk_units.append(next_unit)
+                current_indices.append(next_idx)
+                current_texts.append(unit_texts[next_idx])
+                current_text_len += len(unit_texts[next_idx]) + 2
 
-        if current_chunk_units:
-            chunk_content = "\n\n".join([u["text"] for u in current_chunk_units])
-            chunk_header_path = current_chunk_units[0]["header_path"]
-            line_ranges = get_chunk_line_ranges(current_chunk_units)
-            chunks.append({
-                "content": chunk_content, 
-                "header_path": chunk_header_path,
-                "line_ranges": line_ranges
-            })
+        if current_indices:
+            flush_chunk(current_indices, current_texts)
 
         return chunks
 
     async def enrich_chunk_metadata(self, chunk_text: str, header_path: str, chunk_index: Optional[int] = None) -> dict:
         for attempt in range(self.max_retries):
             try:
-                raw = await self.async_chat_client.chat.completions.create(
-                    model=self.chat_model,
-                    response_model=ChunkMetadata,
-                    messages=[
-                        {"role": "system", "content": "Analyze the provided scientific text and extract the requested metadata."},
-                        {"role": "user", "content": f"Context/Header Path: {header_path}\n\nText:\n{chunk_text[:10000]}"}
-                    ]
-                )
+                # Stream partial objects so parsing overlaps token generation;
+                # the last yielded partial carries the complete metadata.
+                async with self.chat_limiter:
+                    stream = self.async_chat_client.chat.completions.create_partial(
+                        model=self.chat_model,
+                        response_model=ChunkMetadata,
+                        messages=[
+                            {"role": "system", "content": "Analyze the provided scientific text and extract the requested metadata."},
+                            {"role": "user", "content": f"Context/Header Path: {header_path}\n\nText:\n{chunk_text[:10000]}"}
+                        ]
+                    )
+                    raw = None
+                    async for partial in stream:
+                        raw = partial
+
+                if raw is not None:
+                    # Re-validate so an incomplete stream raises and is retried
+                    data = ChunkMetadata.model_validate(raw.model_dump()).model_dump()
 
-                if isinstance(raw, ChunkMetadata):
-                    data = raw.model_dump()
-                    
                     data["hypothetical_questions"] = data["hypothetical_questions"][:4]
                     data["keywords"] = data["keywords"][:5]
                     return data
@@ -368,6 +578,63 @@ class Chunker:
         # Return empty metadata if all retries failed
         return {"summary": "", "hypothetical_questions": [], "keywords": []}
 
+    async def enrich_chunks_batch(self, chunks: List[Tuple[str, str]], start_index: Optional[int] = None) -> List[dict]:
+        """Enrich several chunks with one chat call instead of one call each."""
+        if len(chunks) == 1:
+            chunk_text, header_path = chunks[0]
+            return [await self.enrich_chunk_metadata(chunk_text, header_path, chunk_index=start_index)]
+
+        sections = []
+        for i, (chunk_text, header_path) in enumerate(chunks, 1):
+            sections.append(f"=== CHUNK {i} (header: {header_path}) ===\n{chunk_text[:10000]}")
+        combined_text = "\n\n".join(sections)
+
+        for attempt in range(self.max_retries):
+            try:
+                # Stream partial objects so parsing overlaps token generation;
+                # the last yielded partial carries the complete batch.
+                async with self.chat_limiter:
+                    stream = self.async_chat_client.chat.completions.create_partial(
+                        model=self.chat_model,
+                        response_model=ChunkMetadataBatch,
+                        messages=[
+                            {"role": "system", "content": f"Analyze each of the {len(chunks)} provided scientific text chunks and extract the requested metadata for every chunk, in order."},
+                            {"role": "user", "content": combined_text}
+                        ]
+                    )
+                    raw = None
+                    async for partial in stream:
+                        raw = partial
+
+                if raw is not None:
+                    # Re-validate so an incomplete stream raises and is retried
+                    batch = ChunkMetadataBatch.model_validate(raw.model_dump())
+                    if len(batch.items) == len(chunks):
+                        results = []
+                        for item in batch.items:
+                            data = item.model_dump()
+                            data["hypothetical_questions"] = data["hypothetical_questions"][:4]
+                            data["keywords"] = data["keywords"][:5]
+                            results.append(data)
+                        return results
+
+            except Exception:
+                if attempt < self.max_retries - 1:
+                    self.console.print(f"[yellow]Batch enrichment attempt {attempt + 1} failed, retrying...[/yellow]")
+                    await asyncio.sleep(1)
+
+        # Fall back to per-chunk enrichment so individual failures are
+        # retried and recorded in failed_enrichments as before.
+        self.console.print("[yellow]Batch enrichment failed, falling back to per-chunk calls.[/yellow]")
+        tasks = [
+            self.enrich_chunk_metadata(
+                chunk_text, header_path,
+                chunk_index=(start_index + i if start_index is not None else None)
+            )
+            for i, (chunk_text, header_path) in enumerate(chunks)
+        ]
+        return list(await asyncio.gather(*tasks))
+
     async def _process_file(self, md_file: Path, content: str, start_index: int = 0) -> List[dict]:
         file_chunks = await self.chunk_text(content)
         result = []
@@ -384,49 +651,123 @@ class Chunker:
         return result
 
     async def process_and_save(self, input_dir: Path = Path("output"), chunks_dir: Path = Path("chunks"), enrich_batch_size: Optional[int] = None, process_images: bool = True) -> None:
-        all_chunks_data: List[dict] = []
-        
         md_files = list(input_dir.rglob("*.md"))
-        tasks = []
-        for md_file in md_files:
+
+        # Bound concurrent file handles while letting reads/writes overlap
+        # with the in-flight embedding and chat HTTP calls.
+        file_sem = asyncio.Semaphore(64)
+
+        async def read_and_process(md_file):
             try:
-                with open(md_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    tasks.append(self._process_file(md_file, content))
+                async with file_sem:
+                    async with aiofiles.open(md_file, "r", encoding="utf-8") as f:
+                        content = await f.read()
             except Exception as e:
                 self.console.print(f"[red]Error reading {md_file}: {e}[/red]")
-        
-        file_results = await asyncio.gather(*tasks)
-        for file_chunks in file_results:
-            all_chunks_data.extend(file_chunks)
+                return []
+            return await self._process_file(md_file, content)
 
-        if not all_chunks_data:
-            self.console.print("[yellow]No chunks found. Exiting.[/yellow]")
-            return
         chunks_dir.mkdir(exist_ok=True)
 
         self.console.print(f"\nSaving chunks to [bold]{chunks_dir}[/bold]...")
 
-        async def enrich_and_save(idx, chunk_data):
-            metadata = await self.enrich_chunk_metadata(chunk_data["content"], chunk_data["header_path"], chunk_index=idx)
+        # Content-hash cache so re-runs over unchanged chunks skip the LLM
+        cache_dir = chunks_dir / ".cache"
+        cache_dir.mkdir(exist_ok=True)
+
+        def cache_key(chunk_data):
+            return hashlib.sha256((chunk_data["content"] + chunk_data["header_path"]).encode()).hexdigest()
+
+        def load_cached_metadata(key):
+            cache_file = cache_dir / f"{key}.json"
+            if not cache_file.exists():
+                return None
+            try:
+                return _loads(cache_file.read_bytes())
+            except Exception:
+                return None
+
+        def save_cached_metadata(key, metadata):
+            with open(cache_dir / f"{key}.json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False)
+
+        async def save_chunk(idx, chunk_data, metadata):
             chunk_data.update(metadata)
             chunk_data["global_chunk_index"] = idx
             chunk_data["chunk_index"] = idx
             chunk_filename = chunks_dir / f"chunk_{idx+1:03d}.json"
-            with open(chunk_filename, "w", encoding="utf-8") as f:
-                json.dump(chunk_data, f, indent=2, ensure_ascii=False)
+            async with file_sem:
+                async with aiofiles.open(chunk_filename, "w", encoding="utf-8") as f:
+                    await f.write(_dumps_indent2(chunk_data))
+
+        async def enrich_and_save_group(start_idx, group):
+            keys = [cache_key(chunk_data) for chunk_data in group]
+            metadatas = [load_cached_metadata(key) for key in keys]
+
+            misses = [j for j, metadata in enumerate(metadatas) if metadata is None]
+            if misses:
+                fresh = await self.enrich_chunks_batch(
+                    [(group[j]["content"], group[j]["header_path"]) for j in misses],
+                    start_index=start_idx + misses[0]
+                )
+                for j, metadata in zip(misses, fresh):
+                    metadatas[j] = metadata
+                    # Don't cache the empty metadata returned on enrichment failure
+                    if metadata.get("summary") or metadata.get("keywords"):
+                        save_cached_metadata(keys[j], metadata)
+
+            for j, (chunk_data, metadata) in enumerate(zip(group, metadatas)):
+                await save_chunk(start_idx + j, chunk_data, metadata)
+
+        batch_size = enrich_batch_size or self.enrich_batch_size
+        group_size = self.enrich_group_size
+
+        # Bounded pipeline: a producer chunks files in order while the
+        # consumer enriches earlier ones, so enrichment RTTs overlap the
+        # embedding calls of later files. The queue cap applies backpressure —
+        # a huge corpus can't pile every chunk into memory when enrichment is
+        # the bottleneck.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=DEFAULT_PIPELINE_BUFFER)
+        saved_count = 0
+
+        async def produce():
+            for md_file in md_files:
+                file_chunks = await read_and_process(md_file)
+                if file_chunks:
+                    await queue.put(file_chunks)
+            await queue.put(None)
 
         with Progress(SpinnerColumn(), TextColumn("{task.description}"), BarColumn(), TimeElapsedColumn(), console=self.console) as progress:
-            task = progress.add_task("Enriching chunks", total=len(all_chunks_data))
-            
-            batch_size = enrich_batch_size or self.enrich_batch_size
-            for i in range(0, len(all_chunks_data), batch_size):
-                batch = all_chunks_data[i:i + batch_size]
-                batch_tasks = [enrich_and_save(i + j, chunk_data) for j, chunk_data in enumerate(batch)]
-                await asyncio.gather(*batch_tasks)
-                progress.update(task, advance=len(batch), description=f"Enriching chunks {i+len(batch)}/{len(all_chunks_data)}")
-
-        self.console.print(f"[green]Saved {len(all_chunks_data)} chunks.[/green]")
+            task = progress.add_task("Enriching chunks", total=None)
+
+            async def consume():
+                nonlocal saved_count
+                pending: List[dict] = []
+                done = False
+                while not done:
+                    item = await queue.get()
+                    if item is None:
+                        done = True
+                    else:
+                        pending.extend(item)
+                    while len(pending) >= batch_size or (done and pending):
+                        batch = pending[:batch_size]
+                        del pending[:batch_size]
+                        batch_tasks = [
+                            enrich_and_save_group(saved_count + j, batch[j:j + group_size])
+                            for j in range(0, len(batch), group_size)
+                        ]
+                        await asyncio.gather(*batch_tasks)
+                        saved_count += len(batch)
+                        progress.update(task, advance=len(batch), description=f"Enriching chunks ({saved_count} done)")
+
+            await asyncio.gather(produce(), consume())
+
+        if saved_count == 0:
+            self.console.print("[yellow]No chunks found. Exiting.[/yellow]")
+            return
+
+        self.console.print(f"[green]Saved {saved_count} chunks.[/green]")
         
         if self.failed_enrichments:
             self.console.print(f"\n[bold red]Failed to enrich {len(self.failed_enrichments)} chunks:[/bold red]")
@@ -2,10 +2,24 @@ import os
 import json
 import asyncio
 import base64
+import hashlib
+import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+import numpy as np
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI, AsyncOpenAI
+import httpx
+from aiolimiter import AsyncLimiter
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError
 import instructor
 from pydantic import BaseModel, Field
 from rich.console import Console
@@ -17,8 +31,11 @@ load_dotenv()
 
 # Configurable defaults
 DEFAULT_MAX_RETRIES = 3
-DEFAULT_BATCH_SIZE = 5
+DEFAULT_MAX_CONCURRENT = 8
 DEFAULT_MAX_IMAGE_SIZE = (1024, 1024)  # Max dimensions for image processing
+DEFAULT_CACHE_DIR = Path("chunks/.cache")
+DEFAULT_VISION_RPM = 300  # requests/minute budget for the vision model
+DEFAULT_EMBEDDING_BATCH_SIZE = 512  # captions per bulk embedding request
 
 class ImageCaption(BaseModel):
     """Structured output for image caption generation."""
@@ -36,195 +53,519 @@ class ImageChunker:
                  vision_api_key: Optional[str] = None,
                  vision_base_url: Optional[str] = None,
                  max_retries: int = DEFAULT_MAX_RETRIES,
-                 batch_size: int = DEFAULT_BATCH_SIZE,
-                 max_image_size: tuple = DEFAULT_MAX_IMAGE_SIZE):
+                 max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+                 max_image_size: tuple = DEFAULT_MAX_IMAGE_SIZE,
+                 cache_dir: Optional[Path] = None,
+                 use_cache: bool = True,
+                 server_side_vectorize: bool = False,
+                 vision_rpm: int = DEFAULT_VISION_RPM,
+                 embedding_batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE):
         
+        # One shared connection pool for the async clients: TLS handshakes and
+        # keep-alive connections are amortized across every caption and
+        # embedding request, and HTTP/2 multiplexes bursts.
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+            timeout=30.0
+        )
+
         # Embedding settings
         self.embedding_model = embedding_model or os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
         embedding_api_key = embedding_api_key or os.getenv("OPENAI_EMBEDDING_API_KEY") or os.getenv("OPENAI_API_KEY")
         embedding_base_url = embedding_base_url or os.getenv("OPENAI_EMBEDDING_BASE_URL") or os.getenv("OPENAI_BASE_URL")
-        
+
         self.embedding_client = OpenAI(api_key=embedding_api_key, base_url=embedding_base_url)
-        self.async_embedding_client = AsyncOpenAI(api_key=embedding_api_key, base_url=embedding_base_url)
-        
+        self.async_embedding_client = AsyncOpenAI(api_key=embedding_api_key, base_url=embedding_base_url, http_client=self._http)
+
         # Vision model settings
         self.vision_model = vision_model or os.getenv("VISION_MODEL", "gpt-4o")
         vision_api_key = vision_api_key or os.getenv("VISION_API_KEY") or os.getenv("OPENAI_API_KEY")
         vision_base_url = vision_base_url or os.getenv("VISION_BASE_URL") or os.getenv("OPENAI_BASE_URL")
-        
+
         self.vision_client = instructor.from_openai(
             OpenAI(api_key=vision_api_key, base_url=vision_base_url),
             mode=instructor.Mode.JSON
         )
         self.async_vision_client = instructor.from_openai(
-            AsyncOpenAI(api_key=vision_api_key, base_url=vision_base_url),
+            AsyncOpenAI(api_key=vision_api_key, base_url=vision_base_url, http_client=self._http),
             mode=instructor.Mode.JSON
         )
         
         # Configuration
         self.max_retries = max_retries
-        self.batch_size = batch_size
+        self.max_concurrent = max_concurrent
         self.max_image_size = max_image_size
-        
+        self.embedding_batch_size = embedding_batch_size
+
+        # Token bucket paces vision requests under the provider's RPM quota
+        # so bursts don't trade useful throughput for 429 retry churn
+        self.vision_limiter = AsyncLimiter(vision_rpm, 60)
+
+        # Content-addressed cache: captions keyed by image-bytes hash,
+        # embeddings keyed by model + caption text hash.
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.use_cache = use_cache
+
+        # When the vector store vectorizes captions itself (e.g. a Weaviate
+        # text2vec module), skip the client-side embedding pass entirely and
+        # write chunks with text_embedding = null
+        self.server_side_vectorize = server_side_vectorize
+
+        # In-process single-flight memo: (model, text) -> Future, so
+        # concurrent duplicates coalesce onto one in-flight request
+        self._emb_cache = {}
+
+        # Bounded in-memory layer over the disk cache: repeat lookups skip
+        # the .npy read entirely. dicts preserve insertion order, so popping
+        # the first key on overflow evicts the oldest entry.
+        self._emb_mem = {}
+        self._emb_mem_max = 50_000
+
+        # Thread pool for PIL decode/resize/encode so CPU-bound image work
+        # runs off the event loop and overlaps in-flight network calls
+        self._cpu_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+        # Static prompt parts built once: keeping the prefix byte-identical
+        # across calls lets provider-side prompt caching kick in
+        self._system_msg = {
+            "role": "system",
+            "content": "You are an expert at analyzing scientific and technical images. Provide detailed, accurate descriptions."
+        }
+        self._user_text_part = {
+            "type": "text",
+            "text": "Analyze this image and provide a detailed caption, key elements, type, and scientific context if applicable."
+        }
+
         self.console = Console()
         self.failed_captions = []
+
+    def _load_cached_caption(self, key: str) -> Optional[ImageCaption]:
+        cache_file = self.cache_dir / "captions" / f"{key}.json"
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                return ImageCaption.model_validate(json.load(f))
+        except Exception:
+            return None
+
+    def _save_cached_caption(self, key: str, caption: ImageCaption) -> None:
+        cache_file = self.cache_dir / "captions" / f"{key}.json"
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(caption.model_dump(), f, ensure_ascii=False)
+        tmp_file.replace(cache_file)
+
+    def _remember_embedding(self, key: str, embedding: List[float]) -> None:
+        if len(self._emb_mem) >= self._emb_mem_max:
+            self._emb_mem.pop(next(iter(self._emb_mem)))
+        self._emb_mem[key] = embedding
+
+    def _load_cached_embedding(self, key: str) -> Optional[List[float]]:
+        cached = self._emb_mem.get(key)
+        if cached is not None:
+            return cached
+        cache_file = self.cache_dir / "embeddings" / f"{key}.npy"
+        if not cache_file.exists():
+            return None
+        try:
+            embedding = np.load(cache_file).tolist()
+        except Exception:
+            return None
+        self._remember_embedding(key, embedding)
+        return embedding
+
+    def _save_cached_embedding(self, key: str, embedding: List[float]) -> None:
+        self._remember_embedding(key, embedding)
+        cache_file = self.cache_dir / "embeddings" / f"{key}.npy"
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".npy.tmp")
+        with open(tmp_file, "wb") as f:
+            # float32 halves the on-disk size vs JSON-encoded float64
+            np.save(f, np.asarray(embedding, dtype=np.float32))
+        tmp_file.replace(cache_file)
         
-    def resize_image_if_needed(self, image_path: Path) -> bytes:
-        """Resize image if it exceeds max dimensions, return as bytes."""
+    def resize_image_if_needed(self, image_path: Path) -> Tuple[bytes, str]:
+        """Resize image if it exceeds max dimensions; return (bytes, mime subtype).
+
+        Opaque images are re-encoded as JPEG quality=85, which is several
+        times smaller than PNG and shrinks the base64 payload sent to the
+        vision model; PNG is kept only when transparency must survive.
+        """
         try:
             with Image.open(image_path) as img:
+                has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (
+                    img.mode == 'P' and 'transparency' in img.info
+                )
+
+                # Fast path: the header check above never decoded pixel data,
+                # so files already within limits and in a supported format can
+                # be passed through byte-for-byte with no decode/re-encode.
+                if (img.size[0] <= self.max_image_size[0]
+                        and img.size[1] <= self.max_image_size[1]
+                        and img.format in ('JPEG', 'PNG')
+                        and img.mode in ('RGB', 'L', 'RGBA', 'LA')):
+                    return image_path.read_bytes(), 'jpeg' if img.format == 'JPEG' else 'png'
+
+                # For oversized JPEGs (scanned pages), draft() asks libjpeg to
+                # decode at a reduced DCT scale so the full-resolution bitmap
+                # is never materialized; thumbnail() then only does a small
+                # final LANCZOS pass
+                if img.format == 'JPEG':
+                    img.draft('RGB', self.max_image_size)
+
                 # Convert to RGB if needed
-                if img.mode not in ('RGB', 'L'):
+                if not has_alpha and img.mode not in ('RGB', 'L'):
                     img = img.convert('RGB')
-                
+
                 # Resize if needed
                 if img.size[0] > self.max_image_size[0] or img.size[1] > self.max_image_size[1]:
                     img.thumbnail(self.max_image_size, Image.Resampling.LANCZOS)
                     self.console.log(f"Resized {image_path.name} from original to {img.size}")
-                
+
                 # Convert to bytes
                 buffer = io.BytesIO()
-                img.save(buffer, format='PNG')
-                return buffer.getvalue()
+                if has_alpha:
+                    img.save(buffer, format='PNG')
+                    return buffer.getvalue(), 'png'
+                img.save(buffer, format='JPEG', quality=85, optimize=True)
+                return buffer.getvalue(), 'jpeg'
         except Exception as e:
             self.console.print(f"[red]Error processing image {image_path}: {e}[/red]")
             raise
     
     def encode_image_to_base64(self, image_bytes: bytes) -> str:
         """Encode image bytes to base64 string."""
+        if pybase64 is not None:
+            # SIMD-accelerated and returns str directly, skipping the
+            # intermediate bytes->str copy
+            return pybase64.b64encode_as_string(image_bytes)
         return base64.b64encode(image_bytes).decode('utf-8')
     
     async def get_text_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text (caption)."""
+        """Generate embedding for text (caption), consulting the caches first."""
+        text = text.replace("\n", " ")
+
+        mem_key = (self.embedding_model, text)
+        in_flight = self._emb_cache.get(mem_key)
+        if in_flight is not None:
+            return await in_flight
+
+        future = asyncio.get_running_loop().create_future()
+        self._emb_cache[mem_key] = future
+
+        embedding: List[float] = []
         try:
-            text = text.replace("\n", " ")
-            response = await self.async_embedding_client.embeddings.create(
-                input=[text],
-                model=self.embedding_model
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            self.console.print(f"[red]Error generating text embedding: {e}[/red]")
-            return []
+            cache_key = hashlib.sha256(f"{self.embedding_model}:{text}".encode()).hexdigest()
+            if self.use_cache:
+                cached = self._load_cached_embedding(cache_key)
+                if cached is not None:
+                    embedding = cached
+
+            if not embedding:
+                try:
+                    response = await self.async_embedding_client.embeddings.create(
+                        input=[text],
+                        model=self.embedding_model
+                    )
+                    embedding = response.data[0].embedding
+                    if self.use_cache:
+                        self._save_cached_embedding(cache_key, embedding)
+                except Exception as e:
+                    self.console.print(f"[red]Error generating text embedding: {e}[/red]")
+        finally:
+            future.set_result(embedding)
+            if not embedding:
+                # Don't memoize failures; let later callers retry
+                self._emb_cache.pop(mem_key, None)
+
+        return embedding
+
+    async def get_text_embeddings_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed many captions with a few bulk API calls instead of one call each."""
+        batch_size = batch_size or self.embedding_batch_size
+        texts = [t.replace("\n", " ") for t in texts]
+        keys = [hashlib.sha256(f"{self.embedding_model}:{t}".encode()).hexdigest() for t in texts]
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        miss_indices = []
+        for i, key in enumerate(keys):
+            if self.use_cache:
+                cached = self._load_cached_embedding(key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            miss_indices.append(i)
+
+        # Dispatch all sub-batches concurrently under a semaphore: total wall
+        # time approaches one round trip instead of one per sub-batch
+        sem = asyncio.Semaphore(self.max_concurrent)
+
+        async def embed_sub(sub: List[int]) -> None:
+            try:
+                async with sem:
+                    response = await self.async_embedding_client.embeddings.create(
+                        input=[texts[i] for i in sub],
+                        model=self.embedding_model
+                    )
+                for i, data in zip(sub, response.data):
+                    results[i] = data.embedding
+                    if self.use_cache:
+                        self._save_cached_embedding(keys[i], data.embedding)
+            except Exception as e:
+                self.console.print(f"[red]Error generating batch embeddings: {e}[/red]")
+
+        await asyncio.gather(*[
+            embed_sub(miss_indices[start:start + batch_size])
+            for start in range(0, len(miss_indices), batch_size)
+        ])
+
+        return [r if r is not None else [] for r in results]
     
     async def generate_image_caption(self, image_path: Path, retry_count: int = 0) -> Optional[ImageCaption]:
         """Generate a structured caption for an image using vision model with retry logic."""
+        # Prepare image once; the resized bytes also serve as the cache key
+        try:
+            image_bytes, image_format = await asyncio.get_running_loop().run_in_executor(
+                self._cpu_pool, self.resize_image_if_needed, image_path
+            )
+        except Exception as e:
+            error_str = str(e)
+            self.failed_captions.append({
+                "image_path": str(image_path),
+                "error": error_str[:500] if len(error_str) > 500 else error_str
+            })
+            return None
+
+        cache_key = hashlib.sha256(image_bytes).hexdigest()
+        if self.use_cache:
+            cached = self._load_cached_caption(cache_key)
+            if cached is not None:
+                return cached
+
+        # Encode on the CPU pool too; for megabyte images this is another
+        # millisecond-scale chunk of work kept off the event loop
+        base64_image = await asyncio.get_running_loop().run_in_executor(
+            self._cpu_pool, self.encode_image_to_base64, image_bytes
+        )
+
         for attempt in range(self.max_retries):
             try:
-                # Prepare image
-                image_bytes = self.resize_image_if_needed(image_path)
-                base64_image = self.encode_image_to_base64(image_bytes)
-                
                 # Generate caption using vision model with structured output
-                response = await self.async_vision_client.chat.completions.create(
-                    model=self.vision_model,
-                    response_model=ImageCaption,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are an expert at analyzing scientific and technical images. Provide detailed, accurate descriptions."
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Analyze this image and provide a detailed caption, key elements, type, and scientific context if applicable."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{base64_image}"
+                async with self.vision_limiter:
+                    response = await self.async_vision_client.chat.completions.create(
+                        model=self.vision_model,
+                        response_model=ImageCaption,
+                        messages=[
+                            self._system_msg,
+                            {
+                                "role": "user",
+                                "content": [
+                                    self._user_text_part,
+                                    {
+                                        "type": "image_url",
+                                        "image_url": {
+                                            "url": f"data:image/{image_format};base64,{base64_image}"
+                                        }
                                     }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=500
-                )
+                                ]
+                            }
+                        ],
+                        max_tokens=500
+                    )
                 
                 if isinstance(response, ImageCaption):
+                    if self.use_cache:
+                        self._save_cached_caption(cache_key, response)
                     return response
                     
             except Exception as e:
                 error_str = str(e)
-                if attempt < self.max_retries - 1:
+                # Only transient transport/quota errors are worth retrying;
+                # schema or bad-request failures would just repeat the same
+                # resize+upload for the same outcome
+                retryable = isinstance(e, (APIConnectionError, APITimeoutError, RateLimitError))
+                if retryable and attempt < self.max_retries - 1:
                     self.console.print(f"[yellow]Attempt {attempt + 1} failed for {image_path.name}, retrying...[/yellow]")
-                    await asyncio.sleep(1)
+                    # Exponential backoff with full jitter so concurrent
+                    # retries don't re-stampede the endpoint in lockstep
+                    await asyncio.sleep(random.uniform(0, 2 ** attempt))
                 else:
-                    self.console.print(f"[red]Failed to caption {image_path.name} after {self.max_retries} attempts: {error_str[:200]}[/red]")
+                    self.console.print(f"[red]Failed to caption {image_path.name}: {error_str[:200]}[/red]")
                     failure_info = {
                         "image_path": str(image_path),
-                        "error": error_str[:500] if len(error_str) > 500 else error_str
+                        "error": error_str[:500] if len(error_str) > 500 else error_str,
+                        "error_type": type(e).__name__
                     }
                     self.failed_captions.append(failure_info)
+                    break
         
         return None
     
-    async def process_single_image(self, image_path: Path, output_dir: Path, global_index: int) -> Optional[dict]:
-        """Process a single image: generate caption and embedding."""
+    def _trivial_caption(self, image_path: Path) -> Optional[ImageCaption]:
+        """Return a stub caption for tiny or single-color images, else None.
+
+        PDF extraction yields many sub-icon images and blank fills that the
+        vision model would caption uselessly at full token cost.
+        """
         try:
-            # Generate caption with retry
+            with Image.open(image_path) as img:
+                if min(img.size) < 64:
+                    return ImageCaption(
+                        caption="<blank figure>",
+                        key_elements=[],
+                        image_type="placeholder",
+                        scientific_context=None
+                    )
+                lo, hi = img.convert("L").getextrema()
+                if lo == hi:
+                    return ImageCaption(
+                        caption="<blank figure>",
+                        key_elements=[],
+                        image_type="placeholder",
+                        scientific_context=None
+                    )
+        except Exception:
+            return None
+        return None
+
+    async def caption_single_image(self, image_path: Path) -> Optional[dict]:
+        """Caption one image; embedding happens later in a bulk pass."""
+        try:
+            stub = await asyncio.get_running_loop().run_in_executor(
+                self._cpu_pool, self._trivial_caption, image_path
+            )
+            if stub is not None:
+                return stub.model_dump()
+
             caption_obj = await self.generate_image_caption(image_path)
-            
             if caption_obj is None:
                 return None
-            
-            caption_dict = caption_obj.model_dump()
-            
-            # Generate text embedding from the caption
-            caption_text = caption_dict["caption"]
-            text_embedding = await self.get_text_embedding(caption_text)
-            
-            # Prepare image chunk data
-            image_data = {
-                "type": "image",
-                "source_image": str(image_path),
-                "caption": caption_dict["caption"],
-                "key_elements": caption_dict["key_elements"],
-                "image_type": caption_dict["image_type"],
-                "scientific_context": caption_dict.get("scientific_context"),
-                "text_embedding": text_embedding,
-                "global_chunk_index": global_index,
-                "chunk_index": global_index
-            }
-            
-            # Save to JSON
-            output_file = output_dir / f"image_{global_index:03d}.json"
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(image_data, f, indent=2, ensure_ascii=False)
-            
-            return image_data
-            
+            return caption_obj.model_dump()
         except Exception as e:
             self.console.print(f"[red]Error processing {image_path}: {e}[/red]")
             return None
+
+    def _write_image_chunk(self, image_path: Path, caption_dict: dict, text_embedding: List[float], output_dir: Path, global_index: int) -> dict:
+        """Assemble and save the JSON chunk for one captioned image."""
+        if text_embedding:
+            # Round to float16 precision before serializing: cosine ranking is
+            # insensitive to the lost bits and the shorter decimal reprs cut
+            # the chunk file size roughly in half
+            text_embedding = np.asarray(text_embedding, dtype=np.float16).tolist()
+        image_data = {
+            "type": "image",
+            "source_image": str(image_path),
+            "caption": caption_dict["caption"],
+            "key_elements": caption_dict["key_elements"],
+            "image_type": caption_dict["image_type"],
+            "scientific_context": caption_dict.get("scientific_context"),
+            "text_embedding": text_embedding,
+            "global_chunk_index": global_index,
+            "chunk_index": global_index
+        }
+
+        output_file = output_dir / f"image_{global_index:03d}.json"
+        if orjson is not None:
+            # C-accelerated serializer; the embedding float list dominates
+            # the stdlib json cost here
+            output_file.write_bytes(orjson.dumps(image_data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_file, "w", encoding="utf-8") as f:
+                json.dump(image_data, f, indent=2, ensure_ascii=False)
+
+        return image_data
     
-    async def process_images(self, input_dir: Path = Path("output"), output_dir: Path = Path("chunks/images")) -> List[dict]:
+    def _load_completed_chunk(self, output_file: Path, expected_source: str) -> Optional[dict]:
+        """Return the chunk dict from a prior run if it is complete, else None.
+
+        The chunk must describe expected_source: chunk files are numbered by
+        sort position, so adding or removing images reshuffles indices and a
+        positional match alone would resume from another image's chunk.
+        """
+        if not output_file.exists():
+            return None
+        try:
+            with open(output_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return None
+        if data.get("source_image") != expected_source:
+            return None
+        if not data.get("caption"):
+            return None
+        if not data.get("text_embedding") and not self.server_side_vectorize:
+            return None
+        return data
+
+    async def process_images(self, input_dir: Path = Path("output"), output_dir: Path = Path("chunks/images"), force: bool = False) -> List[dict]:
         """Find and process all images in the input directory recursively."""
         # Create output directory
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Find all image files
+        # Find all image files in one case-insensitive walk instead of one
+        # rglob traversal per extension/case combination
         image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
-        image_paths = []
-        
-        for ext in image_extensions:
-            image_paths.extend(input_dir.rglob(f"*{ext}"))
-            image_paths.extend(input_dir.rglob(f"*{ext.upper()}"))
-        
-        # Remove duplicates and sort
-        image_paths = sorted(set(image_paths))
+        image_paths = sorted(
+            Path(root) / name
+            for root, _, files in os.walk(input_dir)
+            for name in files
+            if os.path.splitext(name)[1].lower() in image_extensions
+        )
         
         if not image_paths:
             self.console.print("[yellow]No images found in the input directory.[/yellow]")
             return []
         
         self.console.print(f"[green]Found {len(image_paths)} images to process[/green]")
+
+        # Resume support: chunks written by a previous run are loaded as-is
+        # and their images never re-enter the caption/embedding pipeline
+        completed: dict = {}
+        if not force:
+            for i, img_path in enumerate(image_paths):
+                data = self._load_completed_chunk(
+                    output_dir / f"image_{i:03d}.json", str(img_path)
+                )
+                if data is not None:
+                    completed[i] = data
+            if completed:
+                self.console.print(f"[cyan]Resuming: {len(completed)} images already processed[/cyan]")
+
+        # Deduplicate by file content so recurring logos/headers/icons are
+        # captioned once and the result is fanned out to every occurrence.
+        def file_sha256(path):
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor() as pool:
+            digests = await asyncio.gather(*[
+                loop.run_in_executor(pool, file_sha256, img_path) for img_path in image_paths
+            ])
+
+        first_seen = {}
+        duplicate_of = {}
+        for i, digest in enumerate(digests):
+            if digest in first_seen:
+                duplicate_of[i] = first_seen[digest]
+            else:
+                first_seen[digest] = i
+
+        if duplicate_of:
+            self.console.print(f"[cyan]{len(duplicate_of)} duplicate images will reuse captions[/cyan]")
         
-        # Process images in batches
-        all_results = []
-        
+        # Phase 1: caption images with a global concurrency cap. A semaphore
+        # keeps max_concurrent captions in flight and starts the next one as
+        # soon as a slot frees, instead of stalling at batch barriers.
+        captions: List[Optional[dict]] = [None] * len(image_paths)
+        sem = asyncio.Semaphore(self.max_concurrent)
+
         with Progress(
             SpinnerColumn(),
             TextColumn("{task.description}"),
@@ -232,23 +573,55 @@ class ImageChunker:
             TimeElapsedColumn(),
             console=self.console
         ) as progress:
-            task = progress.add_task("Processing images", total=len(image_paths))
-            
-            for i in range(0, len(image_paths), self.batch_size):
-                batch = image_paths[i:i + self.batch_size]
-                batch_tasks = [
-                    self.process_single_image(img_path, output_dir, i + j)
-                    for j, img_path in enumerate(batch)
-                ]
-                
-                batch_results = await asyncio.gather(*batch_tasks)
-                all_results.extend([r for r in batch_results if r is not None])
-                
-                progress.update(
-                    task,
-                    advance=len(batch),
-                    description=f"Processing images {i + len(batch)}/{len(image_paths)}"
-                )
+            task = progress.add_task("Captioning images", total=len(image_paths))
+            if completed:
+                progress.update(task, advance=len(completed))
+
+            async def caption_guarded(index, img_path):
+                async with sem:
+                    captions[index] = await self.caption_single_image(img_path)
+
+            # as_completed advances the bar the moment each caption lands, in
+            # completion order, rather than waiting on a gather barrier
+            tasks = [
+                asyncio.ensure_future(caption_guarded(i, img_path))
+                for i, img_path in enumerate(image_paths)
+                if i not in duplicate_of and i not in completed
+            ]
+            for fut in asyncio.as_completed(tasks):
+                await fut
+                progress.update(task, advance=1)
+
+            # Fan captions out to duplicate paths
+            for i, rep in duplicate_of.items():
+                if i in completed:
+                    continue
+                if captions[rep] is None and rep in completed:
+                    rep_chunk = completed[rep]
+                    captions[i] = {
+                        key: rep_chunk.get(key)
+                        for key in ("caption", "key_elements", "image_type", "scientific_context")
+                    }
+                else:
+                    captions[i] = captions[rep]
+                progress.update(task, advance=1)
+
+        # Phase 2: embed all captions in a few bulk calls, then write chunks
+        captioned = [(i, c) for i, c in enumerate(captions) if c is not None and i not in completed]
+        if self.server_side_vectorize:
+            embeddings: List[Optional[List[float]]] = [None] * len(captioned)
+        else:
+            embeddings = await self.get_text_embeddings_batch([c["caption"] for _, c in captioned])
+
+        written = await asyncio.gather(*[
+            loop.run_in_executor(
+                self._cpu_pool, self._write_image_chunk,
+                image_paths[global_index], caption_dict, text_embedding, output_dir, global_index
+            )
+            for (global_index, caption_dict), text_embedding in zip(captioned, embeddings)
+        ])
+        all_results = list(completed.values()) + list(written)
+        all_results.sort(key=lambda data: data["global_chunk_index"])
         
         self.console.print(f"[green]Successfully processed {len(all_results)} images[/green]")
         
@@ -258,12 +631,20 @@ class ImageChunker:
                 self.console.print(f"\n[bold]Failure #{idx}:[/bold]")
                 self.console.print(f"  Image: [cyan]{failure['image_path']}[/cyan]")
                 self.console.print(f"  Error: [red]{failure['error']}[/red]")
-        
+
+        await self.aclose()
+
         return all_results
-    
-    def run(self, input_dir: Path = Path("output"), output_dir: Path = Path("chunks/images")):
+
+    async def aclose(self):
+        """Close the shared HTTP connection pool."""
+        await self._http.aclose()
+
+    def run(self, input_dir: Path = Path("output"), output_dir: Path = Path("chunks/images"), use_cache: Optional[bool] = None, force: bool = False):
         """Main entry point for image processing."""
-        return asyncio.run(self.process_images(input_dir, output_dir))
+        if use_cache is not None:
+            self.use_cache = use_cache
+        return asyncio.run(self.process_images(input_dir, output_dir, force=force))
 
 if __name__ == "__main__":
     chunker = ImageChunker()
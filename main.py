@@ -1,15 +1,38 @@
 import os
 import json
 import base64
-from typing import List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional C-accelerated JSON; stdlib fallback below
+    orjson = None
+
+try:
+    # Line editing + history for the interactive query loop; importing it
+    # is enough to upgrade input(), and it costs nothing at runtime
+    import readline  # noqa: F401
+except ImportError:
+    pass  # not available on this platform
+
+try:
+    import tiktoken
+except ImportError:  # optional exact token counting; char estimate below
+    tiktoken = None
+import heapq
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import List, NamedTuple, Optional
 from pathlib import Path
 
 import weaviate
 from weaviate.classes.config import Configure, Property, DataType, VectorDistances
+from weaviate.classes.data import DataObject
 from weaviate.classes.query import MetadataQuery
+from weaviate.util import generate_uuid5
 import instructor
 from openai import OpenAI
 from pydantic import BaseModel, Field
+import numpy as np
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.table import Table
@@ -25,6 +48,146 @@ load_dotenv()
 console = Console()
 
 
+def _loads(raw: bytes):
+    """Parse JSON bytes with orjson when available, stdlib otherwise."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class ChunkRecord(NamedTuple):
+    """Typed view of one chunk JSON file.
+
+    Fields resolve by slot offset in the ingest loop instead of repeated
+    string-hashed dict.get lookups per insert.
+    """
+    content: str = ""
+    header_path: str = ""
+    source_file: str = ""
+    chunk_index: int = 0
+    global_chunk_index: int = 0
+    summary: str = ""
+    hypothetical_questions: List[str] = []
+    keywords: List[str] = []
+
+
+# Single C-level translate pass instead of chained .replace calls
+_WS_TRANSLATION = str.maketrans("\n\r\t", "   ")
+
+# Input limit for the OpenAI embedding endpoint
+_EMBED_TOKEN_LIMIT = 8192
+
+
+@lru_cache(maxsize=None)
+def _token_encoder(model: str):
+    """Resolve the tiktoken encoding for a model, or None without tiktoken."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _truncate_texts(texts: List[str], model: str) -> List[str]:
+    """Cap each text at the embedding model's input limit.
+
+    With tiktoken, encode_batch tokenizes the whole list in one Rust-backed
+    call; without it, a conservative ~4 chars/token character cap applies.
+    """
+    enc = _token_encoder(model)
+    if enc is None:
+        limit = _EMBED_TOKEN_LIMIT * 4
+        return [t if len(t) <= limit else t[:limit] for t in texts]
+    token_lists = enc.encode_batch(texts, disallowed_special=())
+    return [
+        t if len(tokens) <= _EMBED_TOKEN_LIMIT else enc.decode(tokens[:_EMBED_TOKEN_LIMIT])
+        for t, tokens in zip(texts, token_lists)
+    ]
+
+
+def _encode_image_blob(record: dict) -> str:
+    """Encode one source image as base64 JPEG for storage in Weaviate."""
+    image_path = Path(record["source_image"])
+    if not image_path.exists():
+        return ""
+    # Re-runs skip PIL entirely: the first pass writes the encoded blob
+    # back into the chunk JSON, keyed on the source file mtime so a
+    # replaced image invalidates the cached base64
+    if (record["image_base64_cached"]
+            and record["image_mtime"] == image_path.stat().st_mtime):
+        return record["image_base64_cached"]
+    with Image.open(image_path) as img:
+        # Already-small JPEGs need no decode/re-encode at all: Image.open
+        # only reads the header, so size/mode checks are cheap and the
+        # original bytes pass straight through
+        if (img.format == 'JPEG'
+                and img.size[0] <= 1024 and img.size[1] <= 1024
+                and img.mode in ('RGB', 'L')):
+            return base64.b64encode(image_path.read_bytes()).decode('utf-8')
+
+        # Resize if too large. BILINEAR is ~4x faster than LANCZOS and
+        # indistinguishable at heavy downscales; keep LANCZOS for mild ones.
+        if img.size[0] > 1024 or img.size[1] > 1024:
+            ratio = max(img.size[0], img.size[1]) / 1024
+            resample = (Image.Resampling.BILINEAR if ratio > 2
+                        else Image.Resampling.LANCZOS)
+            img.thumbnail((1024, 1024), resample)
+
+        # Convert to RGB if needed
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        # JPEG q85 encodes several times faster than PNG DEFLATE and
+        # yields a far smaller payload
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def _prepare_image(image_file, store_blob: bool = False) -> dict:
+    """Parse one image chunk JSON and optionally encode its display blob.
+
+    Module-level so ProcessPoolExecutor workers can pickle it. Failures are
+    returned in the record's "error" field instead of raised so the parent
+    process can report them and keep going.
+    """
+    try:
+        image_data = _loads(Path(image_file).read_bytes())
+    except Exception as e:
+        return {"chunk_file": image_file, "error": str(e)}
+
+    caption = image_data.get("caption", "")
+    key_elements = image_data.get("key_elements", [])
+    scientific_context = image_data.get("scientific_context", "")
+
+    # Build full caption with context
+    full_caption = caption
+    if scientific_context:
+        full_caption += f" {scientific_context}"
+    if key_elements:
+        full_caption += f" Key elements: {', '.join(key_elements)}"
+
+    record = {
+        "source_image": image_data.get("source_image", ""),
+        "full_caption": full_caption,
+        "text_embedding": image_data.get("text_embedding", []) or [],
+        "chunk_file": image_file,
+        "image_base64_cached": image_data.get("image_base64_cached", ""),
+        "image_mtime": image_data.get("image_mtime"),
+        "blob": "",
+        "error": None,
+    }
+
+    if store_blob:
+        try:
+            record["blob"] = _encode_image_blob(record)
+        except Exception as e:
+            record["error"] = f"could not encode image: {e}"
+
+    return record
+
+
 # Pydantic models for query generation
 class GeneratedQueries(BaseModel):
     """Generated queries for keyword and hypothetical question searches"""
@@ -36,15 +199,23 @@ class GeneratedQueries(BaseModel):
     )
 
 
+class BatchedGeneratedQueries(BaseModel):
+    """Generated queries for several user questions in one LLM call"""
+    queries: List[GeneratedQueries] = Field(
+        description="One GeneratedQueries entry per user question, in the same order"
+    )
+
+
 class WeaviateManager:
     """Manages Weaviate database connections and operations"""
     
     def __init__(
         self, 
-        host: Optional[str] = None, 
+        host: Optional[str] = None,
         port: Optional[int] = None,
         grpc_port: Optional[int] = None,
-        scheme: Optional[str] = None
+        scheme: Optional[str] = None,
+        store_image_blobs: bool = False
     ):
         # Load Weaviate configuration from environment
         weaviate_host = host or os.getenv("WEAVIATE_HOST", "localhost")
@@ -79,6 +250,31 @@ class WeaviateManager:
         embedding_base_url = os.getenv("OPENAI_EMBEDDING_BASE_URL") or openai_base_url
         self.embedding_client = OpenAI(api_key=embedding_api_key, base_url=embedding_base_url)
         self.embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+        # Bounded query-embedding cache: repeat searches for the same text
+        # skip the OpenAI round trip. dicts preserve insertion order, so
+        # popping the first key evicts the oldest entry.
+        self._embed_cache = {}
+        self._embed_cache_max = 4096
+
+        # Query-expansion cache: re-asked questions skip the LLM round trip
+        self._query_cache = {}
+
+        # Whether to base64-encode image files into the Image collection;
+        # rows always carry image_path, so the blob is optional weight
+        self.store_image_blobs = store_image_blobs
+
+        # Lazily cached collection handles; resolving them on every search
+        # and ingest call rebuilds the v4 wrapper object each time
+        self._collections = {}
+
+    def _collection(self, name: str):
+        """Return a cached handle for a Weaviate collection"""
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self.client.collections.get(name)
+            self._collections[name] = collection
+        return collection
         
     def __enter__(self):
         return self
@@ -102,6 +298,9 @@ class WeaviateManager:
             self.client.collections.create(
                 name="Content",
                 vectorizer_config=Configure.Vectorizer.none(),
+                vector_index_config=Configure.VectorIndex.hnsw(
+                    distance_metric=VectorDistances.COSINE,
+                ),
                 properties=[
                     Property(name="content", data_type=DataType.TEXT),
                     Property(name="header_path", data_type=DataType.TEXT),
@@ -144,8 +343,11 @@ class WeaviateManager:
             self.client.collections.create(
                 name="ImageCaption",
                 vectorizer_config=Configure.Vectorizer.none(),
+                # Scalar quantization: int8 codes cut index RAM ~4x with
+                # negligible recall loss for cosine on normalized embeddings
                 vector_index_config=Configure.VectorIndex.hnsw(
-                    distance_metric=VectorDistances.COSINE
+                    distance_metric=VectorDistances.COSINE,
+                    quantizer=Configure.VectorIndex.Quantizer.sq()
                 ),
                 properties=[
                     Property(name="caption", data_type=DataType.TEXT),
@@ -162,7 +364,8 @@ class WeaviateManager:
                 name="Image",
                 vectorizer_config=Configure.Vectorizer.none(),
                 vector_index_config=Configure.VectorIndex.hnsw(
-                    distance_metric=VectorDistances.COSINE
+                    distance_metric=VectorDistances.COSINE,
+                    quantizer=Configure.VectorIndex.Quantizer.sq()
                 ),
                 properties=[
                     Property(name="image_path", data_type=DataType.TEXT),
@@ -173,171 +376,285 @@ class WeaviateManager:
             )
             console.print(f"[green]✓[/green] Created 'Image' collection with vector support")
     
-    def load_chunks_to_weaviate(self, chunks_dir: str = "chunks"):
+    def load_chunks_to_weaviate(self, chunks_dir: str = "chunks", insert_batch_size: int = 500):
         """Load all chunk JSON files into Weaviate collections"""
         chunks_path = Path(chunks_dir)
         chunk_files = sorted(chunks_path.glob("chunk_*.json"))
-        
-        content_collection = self.client.collections.get("Content")
-        hypo_collection = self.client.collections.get("HypotheticalQuestion")
-        keyword_collection = self.client.collections.get("Keyword")
-        
+
+        content_collection = self._collection("Content")
+        hypo_collection = self._collection("HypotheticalQuestion")
+        keyword_collection = self._collection("Keyword")
+
+        # Accumulate rows per collection, then bulk-insert with insert_many:
+        # one gRPC round trip per batch instead of one per row
+        content_objs = []
+        hypo_objs = []
+        keyword_objs = []
+
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             console=console
         ) as progress:
             task = progress.add_task(f"[cyan]Loading {len(chunk_files)} chunks...", total=len(chunk_files))
-            
-            for chunk_file in chunk_files:
-                with open(chunk_file, 'r', encoding='utf-8') as f:
-                    chunk_data = json.load(f)
-                
-                # Insert into Content collection
-                content_uuid = content_collection.data.insert({
-                    "content": chunk_data.get("content", ""),
-                    "header_path": chunk_data.get("header_path", ""),
-                    "source_file": chunk_data.get("source_file", ""),
-                    "chunk_index": chunk_data.get("chunk_index", 0),
-                    "global_chunk_index": chunk_data.get("global_chunk_index", 0),
-                    "summary": chunk_data.get("summary", ""),
-                })
-                
-                # Insert hypothetical questions
-                for question in chunk_data.get("hypothetical_questions", []):
-                    hypo_collection.data.insert({
-                        "question": question,
-                        "chunk_reference": chunk_data.get("chunk_index", 0),
-                        "global_chunk_index": chunk_data.get("global_chunk_index", 0),
-                    })
-                
-                # Insert keywords
-                for keyword in chunk_data.get("keywords", []):
-                    keyword_collection.data.insert({
-                        "keyword": keyword,
-                        "chunk_reference": chunk_data.get("chunk_index", 0),
-                        "global_chunk_index": chunk_data.get("global_chunk_index", 0),
-                    })
-                
+
+            # Read and decode the JSON files on a thread pool; pool.map keeps
+            # results in file order so chunk numbering is unchanged. The
+            # dict.get defaulting happens once here, so the ingest loop
+            # below works on slot-offset attribute access.
+            def read_chunk(chunk_file):
+                data = _loads(Path(chunk_file).read_bytes())
+                return ChunkRecord(
+                    content=data.get("content", ""),
+                    header_path=data.get("header_path", ""),
+                    source_file=data.get("source_file", ""),
+                    chunk_index=data.get("chunk_index", 0),
+                    global_chunk_index=data.get("global_chunk_index", 0),
+                    summary=data.get("summary", ""),
+                    hypothetical_questions=data.get("hypothetical_questions", []),
+                    keywords=data.get("keywords", []),
+                )
+
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                chunk_datas = list(pool.map(read_chunk, chunk_files))
+
+            # Embed chunk contents in batch so Content supports native
+            # server-side hybrid (BM25 + vector) queries
+            embed_task = progress.add_task("[cyan]Embedding chunk contents...", total=None)
+            content_vectors = self.get_text_embeddings(
+                [chunk_data.content for chunk_data in chunk_datas]
+            )
+            progress.remove_task(embed_task)
+
+            for chunk_data, content_vector in zip(chunk_datas, content_vectors):
+                # Deterministic IDs derived from content: reloading the same
+                # chunks upserts in place instead of inserting duplicate rows
+                source_file = chunk_data.source_file
+                global_index = chunk_data.global_chunk_index
+                chunk_id = generate_uuid5(
+                    f"{source_file}:{global_index}:{chunk_data.content}"
+                )
+
+                content_objs.append(DataObject(
+                    uuid=chunk_id,
+                    properties={
+                        "content": chunk_data.content,
+                        "header_path": chunk_data.header_path,
+                        "source_file": source_file,
+                        "chunk_index": chunk_data.chunk_index,
+                        "global_chunk_index": global_index,
+                        "summary": chunk_data.summary,
+                    },
+                    vector=np.asarray(content_vector, dtype=np.float32) if content_vector else None,
+                ))
+
+                for question in chunk_data.hypothetical_questions:
+                    hypo_objs.append(DataObject(
+                        uuid=generate_uuid5(f"question:{chunk_id}:{question}"),
+                        properties={
+                            "question": question,
+                            "chunk_reference": chunk_data.chunk_index,
+                            "global_chunk_index": global_index,
+                        }
+                    ))
+
+                for keyword in chunk_data.keywords:
+                    keyword_objs.append(DataObject(
+                        uuid=generate_uuid5(f"keyword:{chunk_id}:{keyword}"),
+                        properties={
+                            "keyword": keyword,
+                            "chunk_reference": chunk_data.chunk_index,
+                            "global_chunk_index": global_index,
+                        }
+                    ))
+
                 progress.advance(task)
-        
+
+            insert_task = progress.add_task("[cyan]Inserting into Weaviate...", total=None)
+            for collection, objs in (
+                (content_collection, content_objs),
+                (hypo_collection, hypo_objs),
+                (keyword_collection, keyword_objs),
+            ):
+                for start in range(0, len(objs), insert_batch_size):
+                    collection.data.insert_many(objs[start:start + insert_batch_size])
+            progress.remove_task(insert_task)
+
         console.print(f"[green]✓[/green] Loaded all chunks successfully")
     
     def get_text_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using OpenAI API"""
         try:
-            text = text.replace("\n", " ")
+            text = text.translate(_WS_TRANSLATION)
+
+            cache_key = (self.embedding_model, text)
+            cached = self._embed_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
             response = self.embedding_client.embeddings.create(
-                input=[text],
+                input=_truncate_texts([text], self.embedding_model),
                 model=self.embedding_model
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+
+            if len(self._embed_cache) >= self._embed_cache_max:
+                self._embed_cache.pop(next(iter(self._embed_cache)))
+            self._embed_cache[cache_key] = embedding
+
+            return embedding
         except Exception as e:
             console.print(f"[red]Error generating embedding: {e}[/red]")
             return []
-    
+
+    def get_text_embeddings(self, texts: List[str], batch_size: int = 96) -> List[List[float]]:
+        """Generate embeddings for many texts with one request per batch"""
+        texts = _truncate_texts(
+            [t.translate(_WS_TRANSLATION) for t in texts], self.embedding_model
+        )
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            sub = texts[start:start + batch_size]
+            try:
+                response = self.embedding_client.embeddings.create(
+                    input=sub,
+                    model=self.embedding_model
+                )
+                embeddings.extend(data.embedding for data in response.data)
+            except Exception as e:
+                console.print(f"[red]Error generating embeddings: {e}[/red]")
+                embeddings.extend([] for _ in sub)
+        return embeddings
+
     def extract_and_encode_images(self, chunks_dir: str = "chunks", output_dir: str = "output"):
         """Load images from chunks/images/*.json files and add them with embeddings to Weaviate"""
         images_path = Path(chunks_dir) / "images"
-        
+
         if not images_path.exists():
             console.print(f"[yellow]Warning: {images_path} not found. Skipping image loading.[/yellow]")
             return
-        
+
         image_files = sorted(images_path.glob("image_*.json"))
-        
+
         if not image_files:
             console.print(f"[yellow]Warning: No image JSON files found in {images_path}[/yellow]")
             return
-        
-        image_collection = self.client.collections.get("Image")
-        caption_collection = self.client.collections.get("ImageCaption")
-        
+
+        # Phase 1: parse the chunk JSONs and encode blobs in worker
+        # processes — json decode and PIL encode are both CPU-bound, so
+        # processes scale past the GIL, and chunksize=16 amortizes the
+        # pickling overhead across batches of files
+        records = []
+        with ProcessPoolExecutor() as pool:
+            prepared = pool.map(
+                partial(_prepare_image, store_blob=self.store_image_blobs),
+                image_files, chunksize=16
+            )
+            for record in prepared:
+                if record.get("error"):
+                    console.print(f"[yellow]Warning: Could not process {record['chunk_file']}: {record['error']}[/yellow]")
+                    if "source_image" not in record:
+                        continue  # parse failure: nothing usable
+                records.append(record)
+
+        # Phase 2: embed every caption that arrived without one in a few
+        # batched requests instead of one round trip per image
+        missing = [i for i, record in enumerate(records) if not record["text_embedding"]]
+        if missing:
+            fresh = self.get_text_embeddings([records[i]["full_caption"] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                records[i]["text_embedding"] = embedding
+
+        # Phase 3a: write freshly encoded blobs back into the chunk JSONs
+        # so subsequent loads take the mtime-keyed cache path in the worker
+        if self.store_image_blobs:
+            for record in records:
+                if not record["blob"] or record["image_base64_cached"]:
+                    continue
+                try:
+                    chunk_path = Path(record["chunk_file"])
+                    data = _loads(chunk_path.read_bytes())
+                    data["image_base64_cached"] = record["blob"]
+                    data["image_mtime"] = Path(record["source_image"]).stat().st_mtime
+                    with open(chunk_path, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, indent=2, ensure_ascii=False)
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Could not cache blob for {record['source_image']}: {e}[/yellow]")
+
+        blobs = [record["blob"] for record in records]
+
         images_loaded = 0
-        
-        with Progress(
+
+        with self.client.batch.dynamic() as batch, Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             console=console
         ) as progress:
-            task = progress.add_task(f"[cyan]Loading {len(image_files)} images...", total=len(image_files))
-            
-            for image_file in image_files:
+            task = progress.add_task(f"[cyan]Loading {len(records)} images...", total=len(records))
+
+            # Phase 3b: queue the batched inserts
+            for record, image_base64 in zip(records, blobs):
                 try:
-                    with open(image_file, 'r', encoding='utf-8') as f:
-                        image_data = json.load(f)
-                    
-                    # Extract data from JSON
-                    source_image = image_data.get("source_image", "")
-                    caption = image_data.get("caption", "")
-                    key_elements = image_data.get("key_elements", [])
-                    image_type = image_data.get("image_type", "")
-                    scientific_context = image_data.get("scientific_context", "")
-                    text_embedding = image_data.get("text_embedding", [])
-                    
-                    # Build full caption with context
-                    full_caption = caption
-                    if scientific_context:
-                        full_caption += f" {scientific_context}"
-                    if key_elements:
-                        full_caption += f" Key elements: {', '.join(key_elements)}"
-                    
-                    # Read and encode the actual image file
-                    image_path = Path(source_image)
-                    image_base64 = ""
-                    
-                    if image_path.exists():
-                        try:
-                            with Image.open(image_path) as img:
-                                # Resize if too large
-                                if img.size[0] > 1024 or img.size[1] > 1024:
-                                    img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-                                
-                                # Convert to RGB if needed
-                                if img.mode not in ('RGB', 'L'):
-                                    img = img.convert('RGB')
-                                
-                                # Convert to base64
-                                buffer = io.BytesIO()
-                                img.save(buffer, format='PNG')
-                                image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                        except Exception as e:
-                            console.print(f"[yellow]Warning: Could not encode image {image_path}: {e}[/yellow]")
-                    
-                    # Use existing embedding or generate new one
-                    if not text_embedding:
-                        text_embedding = self.get_text_embedding(full_caption)
-                    
+                    source_image = record["source_image"]
+                    full_caption = record["full_caption"]
+                    text_embedding = record["text_embedding"]
+
                     if text_embedding:
-                        # Insert into Image collection with embedding
-                        image_collection.data.insert(
+                        # float32 ndarrays serialize over gRPC as packed
+                        # floats instead of per-element Python floats (and
+                        # upcast the float16 lists stored in chunk files)
+                        vector = np.asarray(text_embedding, dtype=np.float32)
+
+                        # Queue both rows on the client-level batch: image and
+                        # caption objects share one buffered gRPC stream with a
+                        # single flush instead of two inserts per image
+                        batch.add_object(
+                            collection="Image",
+                            uuid=generate_uuid5(f"image:{source_image}"),
                             properties={
                                 "image_path": source_image,
                                 "image_base64": image_base64,
                                 "chunk_reference": 0,  # Not directly linked to chunks
                                 "global_chunk_index": images_loaded,
                             },
-                            vector=text_embedding
+                            vector=vector
                         )
-                        
-                        # Insert caption with embedding
-                        caption_collection.data.insert(
+
+                        batch.add_object(
+                            collection="ImageCaption",
+                            uuid=generate_uuid5(f"caption:{source_image}:{full_caption}"),
                             properties={
                                 "caption": full_caption,
                                 "image_path": source_image,
                                 "chunk_reference": 0,
                                 "global_chunk_index": images_loaded,
                             },
-                            vector=text_embedding
+                            vector=vector
                         )
-                        
+
                         images_loaded += 1
-                
+
                 except Exception as e:
-                    console.print(f"[yellow]Warning: Could not process {image_file}: {e}[/yellow]")
-                
+                    console.print(f"[yellow]Warning: Could not process {record['source_image']}: {e}[/yellow]")
+
                 progress.advance(task)
-        
+
+        # The batch only flushes on context exit, so queued is not loaded:
+        # per-object errors land in failed_objects and nothing raises.
+        # Report each failure and drop its image from the loaded count.
+        failed = self.client.batch.failed_objects
+        if failed:
+            failed_images = set()
+            for failure in failed:
+                props = getattr(failure.object_, "properties", None) or {}
+                image_path = props.get("image_path", "unknown")
+                failed_images.add(image_path)
+                console.print(
+                    f"[yellow]Warning: Could not insert {failure.object_.collection} "
+                    f"object for {image_path}: {failure.message}[/yellow]"
+                )
+            images_loaded -= len(failed_images)
+
         console.print(f"[green]✓[/green] Loaded {images_loaded} images with embeddings")
     
     def generate_queries(self, user_query: str, model: Optional[str] = None) -> GeneratedQueries:
@@ -345,7 +662,12 @@ class WeaviateManager:
         
         # Use model from environment or override
         model_name = model or self.model
-        
+
+        cache_key = (model_name, user_query)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         response = self.openai_client.chat.completions.create(
             model=model_name,
             response_model=GeneratedQueries,
@@ -364,80 +686,143 @@ Be specific and focused. Generate 3-5 queries for each type."""
                 }
             ]
         )
-        
+
+        self._query_cache[cache_key] = response
         return response
-    
-    def search_content(self, query: str, limit: int = 5):
-        """Direct search in Content collection"""
-        content_collection = self.client.collections.get("Content")
-        
+
+    def generate_queries_batch(self, user_queries: List[str], model: Optional[str] = None) -> List[GeneratedQueries]:
+        """Expand several user questions with a single LLM round trip"""
+
+        model_name = model or self.model
+
+        # Serve what the cache already has; only ask for the rest
+        missing = [q for q in user_queries
+                   if (model_name, q) not in self._query_cache]
+
+        if missing:
+            numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(missing, 1))
+            response = self.openai_client.chat.completions.create(
+                model=model_name,
+                response_model=BatchedGeneratedQueries,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": """You are a query expansion assistant. For EACH numbered user question below, generate:
+1. Keyword queries: Extract key terms and concepts that would help find relevant content
+2. Hypothetical queries: Generate questions that, if answered, would help answer the user's question
+
+Be specific and focused. Generate 3-5 queries of each type per question, and return one entry per question in the same order."""
+                    },
+                    {
+                        "role": "user",
+                        "content": f"User questions:\n{numbered}"
+                    }
+                ]
+            )
+
+            if len(response.queries) == len(missing):
+                for query, generated in zip(missing, response.queries):
+                    self._query_cache[(model_name, query)] = generated
+            else:
+                # Malformed batch: fall back to one call per question
+                for query in missing:
+                    self.generate_queries(query, model=model_name)
+
+        return [self._query_cache[(model_name, q)] for q in user_queries]
+
+    def search_content(self, query: str, limit: int = 5, query_embedding: Optional[List[float]] = None):
+        """Hybrid (BM25 + vector) search in Content collection"""
+        content_collection = self._collection("Content")
+
+        if query_embedding is None:
+            query_embedding = self.get_text_embedding(query)
+
+        if query_embedding:
+            # Native hybrid query: BM25 and vector hits are fused server-side
+            # in one round trip instead of two queries merged client-side
+            response = content_collection.query.hybrid(
+                query=query,
+                vector=query_embedding,
+                alpha=0.5,
+                limit=limit,
+                return_metadata=MetadataQuery(score=True)
+            )
+            return response.objects
+
+        # Fallback to BM25: the collection has no vectorizer, so a hybrid
+        # query without a client-side vector fails server-side
         response = content_collection.query.bm25(
             query=query,
             limit=limit,
             return_metadata=MetadataQuery(score=True)
         )
-        
+
         return response.objects
     
     def search_hypothetical_questions(self, queries: List[str], limit: int = 5):
         """Search using generated hypothetical questions"""
-        hypo_collection = self.client.collections.get("HypotheticalQuestion")
-        
-        all_results = []
-        for query in queries:
-            response = hypo_collection.query.bm25(
+        hypo_collection = self._collection("HypotheticalQuestion")
+
+        # One BM25 round trip per generated query; run them concurrently
+        def run_query(query):
+            return hypo_collection.query.bm25(
                 query=query,
                 limit=limit,
                 return_metadata=MetadataQuery(score=True)
             )
-            all_results.extend(response.objects)
-        
-        # Sort by score and deduplicate
-        all_results.sort(key=lambda x: x.metadata.score, reverse=True)
-        seen_indices = set()
-        unique_results = []
+
+        all_results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(queries)))) as pool:
+            for response in pool.map(run_query, queries):
+                all_results.extend(response.objects)
         
+        # Keep the best-scoring hit per chunk, then take the top `limit`
+        # with a partial sort instead of sorting the whole result list
+        best = {}
         for result in all_results:
             global_idx = result.properties.get("global_chunk_index")
-            if global_idx not in seen_indices:
-                seen_indices.add(global_idx)
-                unique_results.append(result)
-        
-        return unique_results[:limit]
+            current = best.get(global_idx)
+            if current is None or result.metadata.score > current.metadata.score:
+                best[global_idx] = result
+
+        return heapq.nlargest(limit, best.values(), key=lambda x: x.metadata.score)
     
     def search_keywords(self, queries: List[str], limit: int = 5):
         """Search using generated keyword queries"""
-        keyword_collection = self.client.collections.get("Keyword")
-        
-        all_results = []
-        for query in queries:
-            response = keyword_collection.query.bm25(
+        keyword_collection = self._collection("Keyword")
+
+        # One BM25 round trip per generated query; run them concurrently
+        def run_query(query):
+            return keyword_collection.query.bm25(
                 query=query,
                 limit=limit,
                 return_metadata=MetadataQuery(score=True)
             )
-            all_results.extend(response.objects)
-        
-        # Sort by score and deduplicate
-        all_results.sort(key=lambda x: x.metadata.score, reverse=True)
-        seen_indices = set()
-        unique_results = []
+
+        all_results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(queries)))) as pool:
+            for response in pool.map(run_query, queries):
+                all_results.extend(response.objects)
         
+        # Keep the best-scoring hit per chunk, then take the top `limit`
+        # with a partial sort instead of sorting the whole result list
+        best = {}
         for result in all_results:
             global_idx = result.properties.get("global_chunk_index")
-            if global_idx not in seen_indices:
-                seen_indices.add(global_idx)
-                unique_results.append(result)
-        
-        return unique_results[:limit]
+            current = best.get(global_idx)
+            if current is None or result.metadata.score > current.metadata.score:
+                best[global_idx] = result
+
+        return heapq.nlargest(limit, best.values(), key=lambda x: x.metadata.score)
     
-    def search_image_captions(self, query: str, limit: int = 5, use_vector: bool = True):
+    def search_image_captions(self, query: str, limit: int = 5, use_vector: bool = True, query_embedding: Optional[List[float]] = None):
         """Search in ImageCaption collection using vector similarity or BM25"""
-        caption_collection = self.client.collections.get("ImageCaption")
-        
+        caption_collection = self._collection("ImageCaption")
+
         if use_vector:
-            # Generate query embedding
-            query_embedding = self.get_text_embedding(query)
+            # Generate query embedding unless the caller already has one
+            if query_embedding is None:
+                query_embedding = self.get_text_embedding(query)
             if query_embedding:
                 response = caption_collection.query.near_vector(
                     near_vector=query_embedding,
@@ -455,13 +840,14 @@ Be specific and focused. Generate 3-5 queries for each type."""
         
         return response.objects
     
-    def search_images(self, query: str, limit: int = 5, use_vector: bool = True):
+    def search_images(self, query: str, limit: int = 5, use_vector: bool = True, query_embedding: Optional[List[float]] = None):
         """Search in Image collection using vector similarity (text-to-image) or BM25"""
-        image_collection = self.client.collections.get("Image")
-        
+        image_collection = self._collection("Image")
+
         if use_vector:
-            # Generate query embedding from text
-            query_embedding = self.get_text_embedding(query)
+            # Generate query embedding from text unless the caller already has one
+            if query_embedding is None:
+                query_embedding = self.get_text_embedding(query)
             if query_embedding:
                 response = image_collection.query.near_vector(
                     near_vector=query_embedding,
@@ -479,17 +865,22 @@ Be specific and focused. Generate 3-5 queries for each type."""
         
         return response.objects
     
-    def hybrid_search(self, user_query: str, limit: int = 10):
+    def hybrid_search(self, user_query: str, limit: int = 10,
+                      generated: Optional[GeneratedQueries] = None):
         """
         Perform hybrid search across all collections:
         - Generate queries for keywords and hypothetical questions using instructor
         - Direct search for content, captions, and images
+
+        Callers that already batch-expanded several questions can pass the
+        matching GeneratedQueries to skip the per-query LLM call.
         """
         console.print(Panel(f"[bold cyan]🔍 Searching for:[/bold cyan] {user_query}", box=box.ROUNDED))
-        
+
         # Generate queries using instructor
-        console.print("\n[yellow]📝 Generating optimized queries...[/yellow]")
-        generated = self.generate_queries(user_query)
+        if generated is None:
+            console.print("\n[yellow]📝 Generating optimized queries...[/yellow]")
+            generated = self.generate_queries(user_query)
         
         console.print(f"\n[cyan]Keyword queries:[/cyan] {', '.join(generated.keyword_queries)}")
         console.print(f"[cyan]Hypothetical queries:[/cyan] {', '.join(generated.hypothetical_queries)}")
@@ -497,11 +888,32 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Search all collections
         console.print("\n[yellow]🔎 Searching collections...[/yellow]")
         
-        content_results = self.search_content(user_query, limit=limit)
-        hypo_results = self.search_hypothetical_questions(generated.hypothetical_queries, limit=limit)
-        keyword_results = self.search_keywords(generated.keyword_queries, limit=limit)
-        caption_results = self.search_image_captions(user_query, limit=limit)
-        image_results = self.search_images(user_query, limit=limit)
+        # Embed the query once, then dispatch all five collection searches
+        # concurrently; latency becomes embedding + max() of the round trips
+        # instead of their sum
+        query_embedding = self.get_text_embedding(user_query)
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            content_future = pool.submit(
+                self.search_content, user_query, limit, query_embedding
+            )
+            hypo_future = pool.submit(
+                self.search_hypothetical_questions, generated.hypothetical_queries, limit
+            )
+            keyword_future = pool.submit(
+                self.search_keywords, generated.keyword_queries, limit
+            )
+            caption_future = pool.submit(
+                self.search_image_captions, user_query, limit, True, query_embedding
+            )
+            image_future = pool.submit(
+                self.search_images, user_query, limit, True, query_embedding
+            )
+
+            content_results = content_future.result()
+            hypo_results = hypo_future.result()
+            keyword_results = keyword_future.result()
+            caption_results = caption_future.result()
+            image_results = image_future.result()
         
         results = {
             "content": content_results,
@@ -513,9 +925,32 @@ Be specific and focused. Generate 3-5 queries for each type."""
         
         return results
     
+    @staticmethod
+    def _make_results_table(columns) -> Table:
+        """Build a results table from (name, style, width) column specs"""
+        table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
+        for name, style, width in columns:
+            table.add_column(name, style=style, width=width)
+        return table
+
+    @staticmethod
+    def _fmt_metric(metadata) -> str:
+        """Format a BM25 score or vector distance for display.
+
+        One getattr probe per metric instead of paired hasattr/attribute
+        branches per row.
+        """
+        score = getattr(metadata, 'score', None)
+        if score is not None:
+            return f"{score:.2f}"
+        distance = getattr(metadata, 'distance', None)
+        if distance is not None:
+            return f"{distance:.4f}"
+        return 'N/A'
+
     def display_results(self, results: dict):
         """Display search results in a readable format"""
-        
+
         console.print("\n[bold cyan]═══════════════════════════════════════════════════════════════════════════════[/bold cyan]")
         console.print("[bold cyan]                              SEARCH RESULTS                                   [/bold cyan]")
         console.print("[bold cyan]═══════════════════════════════════════════════════════════════════════════════[/bold cyan]")
@@ -523,21 +958,21 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Content results
         if results["content"]:
             console.print("\n[bold green]📄 CONTENT MATCHES[/bold green]")
-            table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
-            table.add_column("#", style="dim", width=4)
-            table.add_column("Score", width=8)
-            table.add_column("Header", width=30)
-            table.add_column("Content Preview", width=50)
-            table.add_column("Chunk", width=6)
-            
+            table = self._make_results_table([
+                ("#", "dim", 4),
+                ("Score", None, 8),
+                ("Header", None, 30),
+                ("Content Preview", None, 50),
+                ("Chunk", None, 6),
+            ])
+
             for i, obj in enumerate(results["content"][:5], 1):
                 props = obj.properties
-                score = f"{obj.metadata.score:.2f}" if hasattr(obj.metadata, 'score') and obj.metadata.score is not None else 'N/A'
                 content_preview = props.get('content', 'N/A')[:100] + "..."
-                
+
                 table.add_row(
                     str(i),
-                    score,
+                    self._fmt_metric(obj.metadata),
                     props.get('header_path', 'N/A')[:30],
                     content_preview,
                     str(props.get('global_chunk_index', 'N/A'))
@@ -547,19 +982,19 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Hypothetical question results
         if results["hypothetical_questions"]:
             console.print("\n[bold yellow]❓ HYPOTHETICAL QUESTION MATCHES[/bold yellow]")
-            table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
-            table.add_column("#", style="dim", width=4)
-            table.add_column("Score", width=8)
-            table.add_column("Question", width=70)
-            table.add_column("Chunk", width=6)
-            
+            table = self._make_results_table([
+                ("#", "dim", 4),
+                ("Score", None, 8),
+                ("Question", None, 70),
+                ("Chunk", None, 6),
+            ])
+
             for i, obj in enumerate(results["hypothetical_questions"][:5], 1):
                 props = obj.properties
-                score = f"{obj.metadata.score:.2f}" if hasattr(obj.metadata, 'score') and obj.metadata.score is not None else 'N/A'
-                
+
                 table.add_row(
                     str(i),
-                    score,
+                    self._fmt_metric(obj.metadata),
                     props.get('question', 'N/A'),
                     str(props.get('global_chunk_index', 'N/A'))
                 )
@@ -568,19 +1003,19 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Keyword results
         if results["keywords"]:
             console.print("\n[bold blue]🔑 KEYWORD MATCHES[/bold blue]")
-            table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
-            table.add_column("#", style="dim", width=4)
-            table.add_column("Score", width=8)
-            table.add_column("Keyword", width=40)
-            table.add_column("Chunk", width=6)
-            
+            table = self._make_results_table([
+                ("#", "dim", 4),
+                ("Score", None, 8),
+                ("Keyword", None, 40),
+                ("Chunk", None, 6),
+            ])
+
             for i, obj in enumerate(results["keywords"][:5], 1):
                 props = obj.properties
-                score = f"{obj.metadata.score:.2f}" if hasattr(obj.metadata, 'score') and obj.metadata.score is not None else 'N/A'
-                
+
                 table.add_row(
                     str(i),
-                    score,
+                    self._fmt_metric(obj.metadata),
                     props.get('keyword', 'N/A'),
                     str(props.get('global_chunk_index', 'N/A'))
                 )
@@ -589,22 +1024,15 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Image caption results
         if results["image_captions"]:
             console.print("\n[bold magenta]🖼️  IMAGE CAPTION MATCHES[/bold magenta]")
-            table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
-            table.add_column("#", style="dim", width=4)
-            table.add_column("Score/Distance", width=12)
-            table.add_column("Caption", width=60)
-            table.add_column("Image Path", width=40)
-            
+            table = self._make_results_table([
+                ("#", "dim", 4),
+                ("Score/Distance", None, 12),
+                ("Caption", None, 60),
+                ("Image Path", None, 40),
+            ])
+
             for i, obj in enumerate(results["image_captions"][:5], 1):
                 props = obj.properties
-                # Handle both score (BM25) and distance (vector)
-                if hasattr(obj.metadata, 'score') and obj.metadata.score is not None:
-                    score = f"{obj.metadata.score:.2f}"
-                elif hasattr(obj.metadata, 'distance') and obj.metadata.distance is not None:
-                    score = f"{obj.metadata.distance:.4f}"
-                else:
-                    score = 'N/A'
-                
                 caption = props.get('caption', 'N/A')
                 # Truncate long captions
                 if len(caption) > 150:
@@ -612,7 +1040,7 @@ Be specific and focused. Generate 3-5 queries for each type."""
                 
                 table.add_row(
                     str(i),
-                    score,
+                    self._fmt_metric(obj.metadata),
                     caption,
                     props.get('image_path', 'N/A')
                 )
@@ -621,24 +1049,18 @@ Be specific and focused. Generate 3-5 queries for each type."""
         # Image results
         if results["images"]:
             console.print("\n[bold red]🎨 IMAGE MATCHES[/bold red]")
-            table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
-            table.add_column("#", style="dim", width=4)
-            table.add_column("Score/Distance", width=12)
-            table.add_column("Image Path", width=80)
-            
+            table = self._make_results_table([
+                ("#", "dim", 4),
+                ("Score/Distance", None, 12),
+                ("Image Path", None, 80),
+            ])
+
             for i, obj in enumerate(results["images"][:5], 1):
                 props = obj.properties
-                # Handle both score (BM25) and distance (vector)
-                if hasattr(obj.metadata, 'score') and obj.metadata.score is not None:
-                    score = f"{obj.metadata.score:.2f}"
-                elif hasattr(obj.metadata, 'distance') and obj.metadata.distance is not None:
-                    score = f"{obj.metadata.distance:.4f}"
-                else:
-                    score = 'N/A'
-                
+
                 table.add_row(
                     str(i),
-                    score,
+                    self._fmt_metric(obj.metadata),
                     props.get('image_path', 'N/A')
                 )
             console.print(table)
@@ -676,8 +1098,16 @@ def main():
         console.print("[bold cyan]                            EXAMPLE SEARCHES                                   [/bold cyan]")
         console.print("[bold cyan]═══════════════════════════════════════════════════════════════════════════════[/bold cyan]")
         
-        for query in example_queries:
-            results = weaviate_mgr.hybrid_search(query, limit=5)
+        # Expand all three questions with one LLM call, then run the
+        # searches concurrently; results display in query order once done
+        batched = weaviate_mgr.generate_queries_batch(example_queries)
+        with ThreadPoolExecutor(max_workers=len(example_queries)) as pool:
+            all_results = list(pool.map(
+                lambda args: weaviate_mgr.hybrid_search(args[0], limit=5, generated=args[1]),
+                zip(example_queries, batched)
+            ))
+
+        for results in all_results:
             weaviate_mgr.display_results(results)
             console.print()
         
@@ -689,17 +1119,24 @@ def main():
             border_style="yellow"
         ))
         
+        # Repeat questions in a session return instantly: the whole search
+        # (LLM expansion plus five collection queries) is memoized on the
+        # normalized query text
+        @lru_cache(maxsize=256)
+        def run_search(query: str, limit: int):
+            return weaviate_mgr.hybrid_search(query, limit=limit)
+
         while True:
             user_input = Prompt.ask("\n[bold green]Enter your query[/bold green]")
-            
+
             if user_input.lower() in ['exit', 'quit', 'q']:
                 console.print("\n[bold cyan]👋 Goodbye![/bold cyan]")
                 break
-            
+
             if not user_input:
                 continue
-            
-            results = weaviate_mgr.hybrid_search(user_input, limit=5)
+
+            results = run_search(user_input.lower().strip(), 5)
             weaviate_mgr.display_results(results)
 
 
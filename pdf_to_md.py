@@ -1,22 +1,98 @@
 import base64
+import hashlib
+import json
+import logging
 import os
+import random
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from mistralai import Mistral
 import html
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Per-process converter for process_many workers: one Mistral client per
+# worker, built once in the initializer, since clients hold connection
+# state that can't be pickled across processes
+_worker_converter = None
+
+
+def _init_worker(api_key: Optional[str], cache_dir: str) -> None:
+    global _worker_converter
+    _worker_converter = PDFToMarkdown(api_key=api_key, cache_dir=cache_dir)
+
+
+def _process_one(args: Tuple[str, str]) -> Tuple[str, str]:
+    pdf_path, output_dir = args
+    return _worker_converter.process(pdf_path, output_dir)
 
 
 class PDFToMarkdown:
-    def __init__(self, api_key: Optional[str] = None, client: Optional[Mistral] = None):
+    def __init__(self, api_key: Optional[str] = None, client: Optional[Mistral] = None,
+                 cache_dir: str = ".ocr_cache"):
         if client is not None:
             self.client = client
         else:
             key = api_key or os.getenv('MISTRAL_API_KEY')
             self.client = Mistral(api_key=key)
+        self.api_key = api_key
+        self.cache_dir = cache_dir
 
     @staticmethod
     def encode_file(file_path: str) -> str:
+        # Encode in 57KB blocks (a multiple of 3, so no padding appears
+        # mid-stream) rather than reading the whole PDF and encoding it in
+        # one shot: peak memory is the encoded output plus one block
+        # instead of ~2.3x the file size
+        encoded = bytearray()
         with open(file_path, "rb") as pdf_file:
-            return base64.b64encode(pdf_file.read()).decode('utf-8')
+            for block in iter(lambda: pdf_file.read(57 * 1024), b""):
+                encoded += base64.b64encode(block)
+        return encoded.decode('ascii')
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """SHA-256 of a file, streamed in 64KB blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Whether an OCR failure is worth retrying (rate limit/overload)"""
+        status = getattr(error, 'status_code', None)
+        if status in (429, 500, 502, 503, 504):
+            return True
+        message = str(error).lower()
+        return 'rate limit' in message or 'overloaded' in message
+
+    @staticmethod
+    def _sniff_ext(base64_data: str) -> str:
+        """Classify an image by its binary magic bytes.
+
+        Decoding the first few base64 chars is constant work, unlike the
+        previous 'image/png' in base64_data substring scan of the whole
+        encoded payload.
+        """
+        payload = base64_data.split(',', 1)[-1]
+        try:
+            head = base64.b64decode(payload[:24])
+        except Exception:
+            return '.jpeg'
+        if head[:3] == b'\xFF\xD8\xFF':
+            return '.jpeg'
+        if head[:4] == b'\x89PNG':
+            return '.png'
+        if head[:4] == b'GIF8':
+            return '.gif'
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return '.webp'
+        return '.jpeg'
 
     @staticmethod
     def fix_html_entities(text: str) -> str:
@@ -24,84 +100,294 @@ class PDFToMarkdown:
 
     @staticmethod
     def save_base64_image(base64_data: str, output_path: str) -> None:
-        if ',' in base64_data:
-            base64_data = base64_data.split(',', 1)[1]
+        # partition finds the data-URL prefix without the separate full
+        # 'in' scan, and the raw fd write skips the BufferedWriter copy
+        # for a one-shot dump
+        _, sep, payload = base64_data.partition(',')
+        image_bytes = base64.b64decode(payload if sep else base64_data)
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, image_bytes)
+        finally:
+            os.close(fd)
+
+    def _load_cached_pages(self, pdf_path: str) -> Optional[list]:
+        """Return cached OCR pages for a PDF, or None on miss"""
+        cache_file = os.path.join(self.cache_dir, f"{self.hash_file(pdf_path)}.json")
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                pages = json.load(f)["pages"]
+            print(f"OCR cache hit for {pdf_path}")
+            return pages
+        except Exception:
+            return None  # unreadable cache entry: redo the OCR call
 
-        image_bytes = base64.b64decode(base64_data)
-        with open(output_path, 'wb') as f:
-            f.write(image_bytes)
+    def _store_cached_pages(self, pdf_path: str, pages: list) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = os.path.join(self.cache_dir, f"{self.hash_file(pdf_path)}.json")
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"pages": pages}, f)
 
     def process(self, pdf_path: str, output_dir: str) -> Tuple[str, str]:
         pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+        # OCR responses are cached on disk keyed by the SHA-256 of the PDF
+        # bytes: re-processing the same file replays markdown assembly and
+        # image writes without paying the multi-second API round trip
+        pages = self._load_cached_pages(pdf_path)
+
+        if pages is None:
+            # Upload the raw PDF once and reference it by signed URL: no
+            # base64 inflation in memory and ~25% fewer bytes on the wire
+            # than the data-URL path
+            with open(pdf_path, "rb") as pdf_file:
+                uploaded = self.client.files.upload(
+                    file={
+                        "file_name": os.path.basename(pdf_path),
+                        "content": pdf_file,
+                    },
+                    purpose="ocr",
+                )
+            signed_url = self.client.files.get_signed_url(file_id=uploaded.id)
+
+            # Retry transient failures (429/5xx/overload) with capped
+            # exponential backoff and jitter so a momentary rate limit or
+            # server overload doesn't kill the whole run
+            max_retries = 5
+            for attempt in range(max_retries):
+                try:
+                    ocr_response = self.client.ocr.process(
+                        model="mistral-ocr-latest",
+                        document={
+                            "type": "document_url",
+                            "document_url": signed_url.url
+                        },
+                        include_image_base64=True,
+                        extract_header=True,
+                        extract_footer=True,
+                    )
+                    break
+                except Exception as e:
+                    if attempt == max_retries - 1 or not self._is_transient(e):
+                        raise
+                    delay = min(60.0, (2 ** attempt) * random.uniform(0.5, 1.5))
+                    print(f"Transient OCR error ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+            # Normalize to plain dicts so the assembly loop below works the
+            # same from a fresh response or from cache
+            pages = [
+                {
+                    "index": page.index,
+                    "markdown": page.markdown,
+                    "images": [
+                        {"id": image.id, "base64": image.image_base64}
+                        for image in page.images
+                    ],
+                }
+                for page in ocr_response.pages
+            ]
+
+            self._store_cached_pages(pdf_path, pages)
+
+        return self._write_output(pdf_name, pages, output_dir)
+
+    def process_batch(self, pdf_paths: List[str], output_dir: str) -> List[Tuple[str, str]]:
+        """OCR many PDFs through the Mistral batch endpoint.
+
+        One JSONL upload and one job replace N individual ocr.process round
+        trips; batch jobs also run under looser rate limits. Cached PDFs
+        skip the job entirely and replay from disk like process() does.
+        """
+        cached = {path: self._load_cached_pages(path) for path in pdf_paths}
+        pending = [path for path, pages in cached.items() if pages is None]
+
+        if pending:
+            # One request entry per uncached PDF, keyed by its list index
+            lines = []
+            for i, pdf_path in enumerate(pending):
+                lines.append(json.dumps({
+                    "custom_id": str(i),
+                    "body": {
+                        "document": {
+                            "type": "document_url",
+                            "document_url": f"data:application/pdf;base64,{self.encode_file(pdf_path)}"
+                        },
+                        "include_image_base64": True,
+                    },
+                }))
+
+            batch_file = self.client.files.upload(
+                file={
+                    "file_name": "ocr_batch.jsonl",
+                    "content": "\n".join(lines).encode('utf-8'),
+                },
+                purpose="batch",
+            )
+
+            job = self.client.batch.jobs.create(
+                input_files=[batch_file.id],
+                model="mistral-ocr-latest",
+                endpoint="/v1/ocr",
+            )
+
+            # Poll with capped backoff until the job reaches a terminal state
+            delay = 2.0
+            while job.status in ("QUEUED", "RUNNING"):
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                job = self.client.batch.jobs.get(job_id=job.id)
+
+            if job.status != "SUCCESS":
+                raise RuntimeError(f"Batch OCR job {job.id} ended with status {job.status}")
+
+            raw = self.client.files.download(file_id=job.output_file).read()
+            for line in raw.decode('utf-8').splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                pdf_path = pending[int(result["custom_id"])]
+
+                # Failed entries land in the job's error file or carry a
+                # non-200 body here; report and leave them uncached instead
+                # of indexing into a body that has no pages
+                response = result.get("response") or {}
+                status_code = response.get("status_code", 200)
+                body = response.get("body") or {}
+                if status_code != 200 or "pages" not in body:
+                    print(f"Batch OCR entry failed for {pdf_path} (status {status_code})")
+                    continue
+
+                pages = [
+                    {
+                        "index": page.get("index", i),
+                        "markdown": page.get("markdown", ""),
+                        "images": [
+                            {"id": image["id"], "base64": image.get("image_base64", "")}
+                            for image in page.get("images", [])
+                        ],
+                    }
+                    for i, page in enumerate(body["pages"])
+                ]
+                cached[pdf_path] = pages
+                self._store_cached_pages(pdf_path, pages)
+
+            # Anything still uncached never produced a success line; name
+            # the PDFs rather than crashing on None during assembly
+            failed = [path for path in pending if cached[path] is None]
+            if failed:
+                raise RuntimeError(
+                    f"Batch OCR job {job.id} returned no result for: {', '.join(failed)}"
+                )
+
+        results = []
+        for pdf_path in pdf_paths:
+            pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            results.append(self._write_output(pdf_name, cached[pdf_path], output_dir))
+        return results
+
+    def process_many(self, pdf_paths: List[str], output_dir: str, workers: int = 4) -> List[Tuple[str, str]]:
+        """Process several PDFs across worker processes.
+
+        Each PDF is independent network I/O plus CPU work (hashing, image
+        decode, markdown assembly), so the loop is embarrassingly parallel.
+        Workers share nothing: every process builds its own client.
+        """
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.api_key, self.cache_dir),
+        ) as pool:
+            return list(pool.map(
+                _process_one, [(pdf_path, output_dir) for pdf_path in pdf_paths]
+            ))
+
+    def _write_output(self, pdf_name: str, pages: list, output_dir: str) -> Tuple[str, str]:
         output_folder = os.path.join(output_dir, pdf_name)
         images_folder = os.path.join(output_folder, "images")
 
         os.makedirs(output_folder, exist_ok=True)
         os.makedirs(images_folder, exist_ok=True)
 
-        base64_file = self.encode_file(pdf_path)
+        # Stream each page to the output file as it is handled instead of
+        # accumulating the whole document in memory first; entities are
+        # unescaped per page, which is equivalent since html.unescape never
+        # spans page boundaries.
+        md_path = os.path.join(output_folder, f"{pdf_name}.md")
+        image_counter = 0
+
+        # Image saves are base64-decode + file-write work with no ordering
+        # constraint, so they run on a thread pool while the page loop keeps
+        # rewriting markdown links; the pool is joined before totals print.
+        # Per-image output goes through the debug logger — a synchronous
+        # stdout flush per image adds real time on figure-dense PDFs.
+        def save_image(image_base64: str, image_path: str) -> None:
+            self.save_base64_image(image_base64, image_path)
+            logger.debug("Saved image: %s", image_path)
 
-        ocr_response = self.client.ocr.process(
-            model="mistral-ocr-latest",
-            document={
-                "type": "document_url",
-                "document_url": f"data:application/pdf;base64,{base64_file}"
-            },
-            include_image_base64=True,
-            extract_header=True,
-            extract_footer=True,
-        )
+        save_futures = []
 
-        full_markdown = []
-        image_counter = 0
+        # Hoist the constant path prefixes out of the per-image loop:
+        # os.path.join is pure-Python string munging that adds up over
+        # thousands of figures, plain concatenation is equivalent here
+        img_dir_prefix = images_folder + os.sep
+        rel_prefix = "images/"
 
-        for page in ocr_response.pages:
-            page_markdown = page.markdown
+        # 1MB write buffer: page writes coalesce into few syscalls instead
+        # of flushing every default-sized block
+        with open(md_path, 'w', encoding='utf-8', buffering=1 << 20) as md_file, \
+                ThreadPoolExecutor() as pool:
+            for page in pages:
+                page_markdown = page["markdown"]
 
-            for image in page.images:
-                image_id = image.id
-                image_base64 = image.image_base64
+                # Map every image id to its on-disk path first, then rewrite
+                # all links in one compiled-regex pass: one markdown scan per
+                # page instead of one full str.replace scan per image
+                id_to_rel = {}
+                for image in page["images"]:
+                    image_id = image["id"]
+                    image_base64 = image["base64"]
 
-                if image_id.endswith('.jpeg') or image_id.endswith('.jpg'):
-                    ext = '.jpeg'
-                elif image_id.endswith('.png'):
-                    ext = '.png'
-                else:
-                    if 'image/png' in image_base64:
+                    if image_id.endswith('.jpeg') or image_id.endswith('.jpg'):
+                        ext = '.jpeg'
+                    elif image_id.endswith('.png'):
                         ext = '.png'
                     else:
-                        ext = '.jpeg'
-
-                image_filename = f"image_{page.index}_{image_counter}{ext}"
-                image_path = os.path.join(images_folder, image_filename)
+                        ext = self._sniff_ext(image_base64)
 
-                self.save_base64_image(image_base64, image_path)
-                print(f"Saved image: {image_path}")
+                    image_filename = f"image_{page['index']}_{image_counter}{ext}"
+                    image_path = img_dir_prefix + image_filename
 
-                relative_image_path = f"images/{image_filename}"
-                page_markdown = page_markdown.replace(f"({image_id})", f"({relative_image_path})")
+                    save_futures.append(pool.submit(save_image, image_base64, image_path))
 
-                image_counter += 1
+                    id_to_rel[image_id] = rel_prefix + image_filename
+                    image_counter += 1
 
-            # if page.header:
-            #     full_markdown.append(f"<!-- Header: {page.header.strip()} -->\n")
+                if id_to_rel:
+                    pattern = re.compile(
+                        r"\((" + "|".join(re.escape(k) for k in id_to_rel) + r")\)"
+                    )
+                    page_markdown = pattern.sub(
+                        lambda m: f"({id_to_rel[m.group(1)]})", page_markdown
+                    )
 
-            full_markdown.append(page_markdown)
+                # if page.header:
+                #     md_file.write(f"<!-- Header: {page.header.strip()} -->\n")
 
-            # if page.footer:
-            #     full_markdown.append(f"\n<!-- Footer: {page.footer.strip()} -->")
+                md_file.write(self.fix_html_entities(page_markdown))
 
-            # Add a newline between pages to prevent words merging, but avoid breaking flow too much
-            full_markdown.append("\n") 
-            # full_markdown.append("\n\n---\n\n")
+                # if page.footer:
+                #     md_file.write(f"\n<!-- Footer: {page.footer.strip()} -->")
 
-        final_markdown = "".join(full_markdown)
+                # Add a newline between pages to prevent words merging, but avoid breaking flow too much
+                md_file.write("\n")
+                # md_file.write("\n\n---\n\n")
 
-        final_markdown = self.fix_html_entities(final_markdown)
-
-        md_path = os.path.join(output_folder, f"{pdf_name}.md")
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(final_markdown)
+        # Surface any save failure rather than silently dropping an image
+        for future in save_futures:
+            future.result()
 
         print(f"\nMarkdown saved to: {md_path}")
         print(f"Images saved to: {images_folder}")